@@ -0,0 +1,113 @@
+import json
+import os
+import re
+from typing import Dict, List
+from dependency_collector import create_collector
+from dependency_graph import DependencyGraph, build_graph_from_config
+from graph_operations import GraphOperations
+from metadata_cache import normalize_name
+from metrics import Metrics
+
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+# Прямая ссылка PEP 508: name[extras] @ url
+_DIRECT_REFERENCE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*@")
+# Имя пакета во фрагменте URL или VCS-ссылки: ...#egg=name
+_EGG_NAME = re.compile(r"[#&]egg=([A-Za-z0-9][A-Za-z0-9._-]*)")
+# Комментарий начинается с # в начале строки или после пробела (# в URL - фрагмент)
+_COMMENT = re.compile(r"(^|\s)#.*$")
+_VCS_PREFIXES = ('git+', 'hg+', 'svn+', 'bzr+')
+
+
+def _url_requirement_name(line: str):
+    """Имя пакета из строки-ссылки (URL или VCS): из #egg=, иначе None"""
+    match = _EGG_NAME.search(line)
+    return match.group(1) if match else None
+
+
+def read_requirement_roots(file_path: str) -> List[str]:
+    """Чтение имен корневых пакетов из requirements.txt или lock-файла в формате pip"""
+    roots = []
+    base_dir = os.path.dirname(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = _COMMENT.sub('', line).strip()
+            if not line:
+                continue
+            # Вложенные файлы требований (-r other.txt)
+            if line.startswith(('-r ', '--requirement ')):
+                nested = line.split(None, 1)[1].strip()
+                roots.extend(read_requirement_roots(os.path.join(base_dir, nested)))
+                continue
+            # Редактируемая установка (-e url#egg=name) разбирается как ссылка
+            if line.startswith(('-e ', '--editable ')):
+                line = line.split(None, 1)[1].strip()
+            # Прочие опции pip и строки продолжения хэшей пропускаются
+            elif line.startswith('-'):
+                continue
+            match = _DIRECT_REFERENCE.match(line)
+            if match:
+                roots.append(match.group(1))
+                continue
+            # Ссылки без имени пакета (URL, VCS, локальные пути) пропускаются
+            if '://' in line or line.startswith(_VCS_PREFIXES) or line.startswith(('.', '/')):
+                name = _url_requirement_name(line)
+                if name:
+                    roots.append(name)
+                continue
+            match = _REQUIREMENT_NAME.match(line)
+            if match:
+                roots.append(match.group(1))
+    return list(dict.fromkeys(roots))
+
+
+def collect_batch_roots(config: Dict) -> List[str]:
+    """Список корневых пакетов пакетного режима (пустой, если режим не включен).
+
+    Имена нормализуются по PEP 503, как имена зависимостей в графе (кроме тестового режима).
+    """
+    roots = list(config.get('packages', []))
+    if config.get('requirements_file'):
+        roots.extend(read_requirement_roots(config['requirements_file']))
+    if not config.get('test_mode', False):
+        roots = [normalize_name(root) for root in roots]
+    return list(dict.fromkeys(roots))
+
+
+def batch_analysis_stage(config: Dict, roots: List[str], metrics: Metrics = None) -> Dict[str, Dict]:
+    """Пакетный анализ: один общий обход для всех корней и отчеты по каждому корню"""
+    print(f"\nПакетный анализ: корневых пакетов {len(roots)}")
+    metrics = metrics or Metrics(enabled=False)
+
+    collector = create_collector(config, metrics)
+    graph_builder = DependencyGraph(collector)
+    # Общее множество посещенных узлов: каждый пакет загружается один раз
+    with metrics.stage('build_graph'):
+        graph = build_graph_from_config(graph_builder, config, roots, metrics)
+    print(f" Общий граф построен. Всего узлов: {len(graph)}")
+
+    with metrics.stage('detect_cycles'):
+        graph_builder.detect_cycles()
+
+    results = {}
+    with metrics.stage('root_reports'):
+        operations = GraphOperations(graph_builder.to_compact())
+        for root in roots:
+            subgraph = graph_builder.subgraph(root)
+            # Компонента сильной связности либо целиком достижима из корня, либо нет
+            cycles = [
+                cycle for cycle, component in zip(graph_builder.cycles, graph_builder.components)
+                if component[0] in subgraph
+            ]
+            results[root] = {
+                'graph': subgraph,
+                'load_order': operations.get_load_order(root),
+                'cycles': cycles
+            }
+            print(f"  {root}: узлов {len(subgraph)}, циклов {len(cycles)}")
+
+    if config.get('batch_report'):
+        with open(config['batch_report'], 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f" Отчет пакетного анализа сохранен в: {config['batch_report']}")
+
+    return results
@@ -0,0 +1,133 @@
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+class _Server(ThreadingHTTPServer):
+    # Очередь по умолчанию (5) переполняется при параллельном обходе,
+    # и клиенты ждут повторной отправки SYN около секунды
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakePyPIServer:
+    """Локальный HTTP-сервер, имитирующий JSON API PyPI для графа зависимостей.
+
+    Обслуживает /pypi/<name>/json, /pypi/<name>/<version>/json и RSS-ленту релизов,
+    отдает ETag и отвечает 304 на условные запросы. latency - задержка каждого ответа
+    в секундах, padding - размер балластной карты releases в полном JSON,
+    error_rate - доля запросов, на которые сервер отвечает 429 (имитация перегрузки).
+    """
+
+    VERSION = "1.0.0"
+
+    def __init__(self, graph: Dict[str, List[str]], latency: float = 0.0, padding: int = 0,
+                 error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.graph = graph
+        self.latency = latency
+        self.padding = padding
+        self.error_rate = error_rate
+        self.throttled = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/pypi"
+
+    def start(self) -> 'FakePyPIServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _package_json(self, name: str, full: bool) -> Dict:
+        info = {
+            'name': name,
+            'version': self.VERSION,
+            'requires_dist': [f"{dep} (>=1.0)" for dep in self.graph[name]] or None
+        }
+        document = {'info': info, 'urls': []}
+        if full:
+            # Историческая карта релизов, которую облегченный режим не загружает
+            document['releases'] = {
+                f"0.{i}.0": [{'filename': f"{name}-0.{i}.0.tar.gz", 'size': 1000}]
+                for i in range(self.padding)
+            }
+            document['releases'][self.VERSION] = []
+        return document
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, как у настоящего PyPI; без Nagle заголовки и тело
+            # не ждут задержанного ACK
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.error_rate and random.random() < server.error_rate:
+                    with server._lock:
+                        server.throttled += 1
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+                if len(parts) == 4 and parts[:2] == ['rss', 'project'] and parts[2] in server.graph:
+                    body = (f"<rss><channel><item><title>{server.VERSION}</title></item>"
+                            f"</channel></rss>").encode()
+                    return self._send(body, 'application/rss+xml')
+                if parts and parts[0] == 'pypi' and len(parts) in (3, 4) and parts[-1] == 'json':
+                    name = parts[1]
+                    if name in server.graph:
+                        document = server._package_json(name, full=len(parts) == 3)
+                        return self._send(json.dumps(document).encode(), 'application/json')
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def _send(self, body: bytes, content_type: str):
+                etag = f'"{zlib.crc32(body):x}"'
+                with server._lock:
+                    server.requests += 1
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                with server._lock:
+                    server.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.synthetic_graphs import (
+    dense_cycle_edges, deep_chain_edges, edges_to_graph, power_law_edges, write_test_file
+)
+from dependency_graph import DependencyGraph
+from graph_operations import GraphOperations
+
+
+class BenchmarkRunner:
+    """Запуск замеров и накопление результатов в машиночитаемом виде"""
+
+    def __init__(self):
+        self.results: List[Dict] = []
+
+    def measure(self, name: str, func: Callable, items=None, **params):
+        """Замер времени выполнения func; items - число обработанных элементов или функция от результата"""
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        count = items(value) if callable(items) else items
+        result = {'name': name, 'seconds': round(elapsed, 6), 'params': params}
+        if count is not None:
+            result['items'] = count
+            result['items_per_second'] = round(count / elapsed, 1) if elapsed > 0 else None
+        self.results.append(result)
+        print(f" {name}: {elapsed:.3f} с" + (f" ({count} эл.)" if count is not None else ""),
+              file=sys.stderr)
+        return value
+
+    def skip(self, name: str, reason: str):
+        self.results.append({'name': name, 'skipped': reason})
+        print(f" {name}: пропущен ({reason})", file=sys.stderr)
+
+
+def bench_test_file_crawl(runner: BenchmarkRunner, size: int, work_dir: str):
+    """Обход тестового репозитория в режимах memory и mmap"""
+    from dependency_collector import DependencyCollector
+
+    file_path = os.path.join(work_dir, 'powerlaw.txt')
+    edges = write_test_file(power_law_edges(size), file_path)
+    for mode in ('memory', 'mmap'):
+        collector = DependencyCollector(test_repo_path=file_path, test_index_mode=mode)
+        graph = runner.measure(
+            f'crawl_test_file_{mode}',
+            lambda: DependencyGraph(collector).build_graph_dfs('pkg0'),
+            items=lambda g: len(g), nodes=size, edges=edges
+        )
+        collector._get_test_index(file_path).close()
+
+
+def bench_http_crawl(runner: BenchmarkRunner, size: int, latency: float, workers: int):
+    """Обход локального сервера, имитирующего PyPI, с заданной задержкой"""
+    try:
+        from dependency_collector import DependencyCollector
+        from benchmarks.fake_pypi import FakePyPIServer
+    except ImportError as e:
+        runner.skip('crawl_http', str(e))
+        return
+
+    graph = edges_to_graph(power_law_edges(size, seed=1))
+    with FakePyPIServer(graph, latency=latency, padding=200) as server:
+        for fetch_mode in ('full', 'lean'):
+            for max_workers in (1, workers):
+                collector = DependencyCollector(server.url, fetch_mode=fetch_mode)
+                requests_before, bytes_before = server.requests, server.bytes_sent
+                builder = DependencyGraph(collector)
+                runner.measure(
+                    f'crawl_http_{fetch_mode}_workers{max_workers}',
+                    lambda: builder.build_graph_multi(['pkg0'], max_workers=max_workers),
+                    items=lambda g: len(g), nodes=size, latency=latency
+                )
+                runner.results[-1]['params']['requests'] = server.requests - requests_before
+                runner.results[-1]['params']['bytes'] = server.bytes_sent - bytes_before
+
+
+def bench_cycles(runner: BenchmarkRunner, size: int):
+    """Поиск циклов на длинной цепочке и на графе с множеством циклов"""
+    for kind, edges in (('chain', deep_chain_edges(size)),
+                        ('dense_cycles', dense_cycle_edges(max(size // 10, 1), 10))):
+        builder = DependencyGraph(None)
+        builder.graph = edges_to_graph(edges)
+        # Компактный граф строится один раз и затем используется всеми этапами
+        runner.measure(f'to_compact_{kind}', builder.to_compact, items=len(builder.graph))
+        runner.measure(f'detect_cycles_{kind}', builder.detect_cycles, items=len(builder.graph))
+
+
+def bench_operations(runner: BenchmarkRunner, size: int):
+    """Порядок загрузки и обратные зависимости на степенном графе"""
+    graph = edges_to_graph(power_law_edges(size, seed=2))
+    operations = runner.measure('graph_operations_init', lambda: GraphOperations(graph),
+                                items=len(graph))
+    runner.measure('get_load_order', lambda: operations.get_load_order('pkg0'), items=len)
+    runner.measure('get_load_order_memoized', lambda: operations.get_load_order('pkg0'), items=len)
+
+    rng = random.Random(0)
+    sample = [f"pkg{rng.randrange(size)}" for _ in range(10000)]
+    runner.measure('reverse_lookups',
+                   lambda: [operations.get_reverse_dependencies(p) for p in sample], items=len(sample))
+
+    # Счетчики и ранжирование идут через блочный подсчет GraphAnalytics на полном графе
+    runner.measure('blast_radius_ranking', lambda: operations.rank_by_blast_radius(5),
+                   items=operations.compact.node_count)
+    runner.measure('transitive_dependent_counts',
+                   lambda: [operations.count_transitive_reverse_dependencies(p) for p in sample[:1000]],
+                   items=1000)
+    runner.measure('transitive_dependent_sets',
+                   lambda: [operations.get_transitive_reverse_dependencies(p) for p in sample[:1000]],
+                   items=1000)
+
+    # Битовый индекс (reachability_index) требует O(C * V / 8) байт, поэтому граф ограничен
+    small = GraphOperations(edges_to_graph(power_law_edges(min(size, 20000), seed=3)),
+                            reachability_index=True)
+    runner.measure('reachability_index_build', lambda: small.reachability, items=small.compact.node_count)
+
+
+def bench_d2(runner: BenchmarkRunner, size: int, work_dir: str):
+    """Потоковая генерация D2 скрипта"""
+    from visualizer import GraphVisualizer
+
+    graph = edges_to_graph(power_law_edges(size, seed=4))
+    visualizer = GraphVisualizer()
+    d2_file = os.path.join(work_dir, 'bench.d2')
+
+    def generate():
+        with open(d2_file, 'w', encoding='utf-8') as f:
+            return visualizer.write_d2_script(graph, 'pkg0', f)
+
+    runner.measure('generate_d2', generate, items=lambda edges: edges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки горячих путей визуализатора зависимостей')
+    parser.add_argument('--size', type=int, default=100000, help='Число пакетов в синтетических графах')
+    parser.add_argument('--http-size', type=int, default=300, help='Число пакетов для HTTP-обхода')
+    parser.add_argument('--latency', type=float, default=0.005, help='Задержка ответа сервера, с')
+    parser.add_argument('--workers', type=int, default=16, help='Параллелизм для параллельного обхода')
+    parser.add_argument('--output', '-o', default='bench_results.json', help='Файл JSON с результатами')
+    args = parser.parse_args()
+
+    runner = BenchmarkRunner()
+    with tempfile.TemporaryDirectory() as work_dir:
+        bench_test_file_crawl(runner, args.size, work_dir)
+        bench_http_crawl(runner, args.http_size, args.latency, args.workers)
+        bench_cycles(runner, args.size)
+        bench_operations(runner, args.size)
+        bench_d2(runner, args.size, work_dir)
+
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': runner.results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f" Результаты сохранены в: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
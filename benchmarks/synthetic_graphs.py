@@ -0,0 +1,94 @@
+import argparse
+import random
+from typing import Dict, Iterator, List, Tuple
+
+Edge = Tuple[str, str]
+
+
+def package_name(index: int) -> str:
+    return f"pkg{index}"
+
+
+def power_law_edges(nodes: int, average_fanout: float = 4.0, alpha: float = 2.1,
+                    seed: int = 0) -> Iterator[Edge]:
+    """Граф со степенным распределением числа зависимостей.
+
+    Зависимости выбираются среди пакетов с большим номером, поэтому граф ацикличен,
+    а популярные пакеты (малые номера среди целей) получают много обратных ребер.
+    """
+    rng = random.Random(seed)
+    # Среднее распределения Парето равно alpha / (alpha - 1), нормируем к average_fanout
+    scale = average_fanout * (alpha - 1) / alpha
+    for source in range(nodes - 1):
+        fanout = min(int(scale * rng.paretovariate(alpha)), nodes - source - 1)
+        targets = set()
+        for _ in range(fanout):
+            # Предпочтение «популярным» пакетам в начале хвоста
+            offset = int((nodes - source - 1) * rng.random() ** 3)
+            targets.add(source + 1 + offset)
+        for target in sorted(targets):
+            yield package_name(source), package_name(target)
+
+
+def deep_chain_edges(nodes: int) -> Iterator[Edge]:
+    """Одна длинная цепочка зависимостей pkg0 -> pkg1 -> ... -> pkgN"""
+    for index in range(nodes - 1):
+        yield package_name(index), package_name(index + 1)
+
+
+def dense_cycle_edges(cycles: int, cycle_size: int, cross_edges: int = 2,
+                      seed: int = 0) -> Iterator[Edge]:
+    """Множество циклов, связанных между собой дополнительными ребрами"""
+    rng = random.Random(seed)
+    # Корень связан с первым узлом каждого цикла
+    for cycle in range(cycles):
+        yield package_name(0), package_name(1 + cycle * cycle_size)
+    for cycle in range(cycles):
+        base = 1 + cycle * cycle_size
+        for offset in range(cycle_size):
+            yield package_name(base + offset), package_name(base + (offset + 1) % cycle_size)
+        for _ in range(cross_edges):
+            other = rng.randrange(cycles)
+            yield package_name(base + rng.randrange(cycle_size)), package_name(1 + other * cycle_size)
+
+
+def edges_to_graph(edges: Iterator[Edge]) -> Dict[str, List[str]]:
+    """Сборка словаря смежности из потока ребер"""
+    graph: Dict[str, List[str]] = {}
+    for source, target in edges:
+        graph.setdefault(source, []).append(target)
+        graph.setdefault(target, [])
+    return graph
+
+
+def write_test_file(edges: Iterator[Edge], file_path: str) -> int:
+    """Запись ребер в формате тестового репозитория ('A -> B'); возвращает число ребер"""
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for source, target in edges:
+            f.write(f"{source} -> {target}\n")
+            count += 1
+    return count
+
+
+GENERATORS = {
+    'powerlaw': lambda size, seed: power_law_edges(size, seed=seed),
+    'chain': lambda size, seed: deep_chain_edges(size),
+    'cycles': lambda size, seed: dense_cycle_edges(max(size // 10, 1), 10, seed=seed),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетических графов зависимостей')
+    parser.add_argument('kind', choices=sorted(GENERATORS))
+    parser.add_argument('size', type=int, help='Число пакетов')
+    parser.add_argument('output', help='Путь к тестовому файлу')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    count = write_test_file(GENERATORS[args.kind](args.size, args.seed), args.output)
+    print(f" Записано ребер: {count} в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import sys
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from itertools import accumulate, chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class CompactGraph:
+    """Компактное представление графа зависимостей.
+
+    Имена пакетов интернируются и получают целочисленные идентификаторы,
+    прямые и обратные ребра хранятся в CSR-массивах (offsets + targets),
+    повторяющиеся ребра отбрасываются. Узлы, которые были ключами исходного
+    словаря, отмечены в has_row: это сохраняет семантику словарного API.
+    """
+
+    def __init__(self, names: List[str], offsets: array, targets: array, has_row: bytearray,
+                 ids: Dict[str, int] = None, reverse: Tuple[array, array] = None):
+        self.names = names
+        self.ids: Dict[str, int] = ids if ids is not None else {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.has_row = has_row
+        # Готовые обратные массивы (например, из снимка) или None для ленивого построения
+        self._reverse = reverse
+
+    @classmethod
+    def from_dict(cls, graph: Dict[str, List[str]], unique_rows: bool = False) -> 'CompactGraph':
+        """Построение компактного графа из словаря смежности.
+
+        unique_rows - списки зависимостей уже без повторов (как в графе обхода): если
+        к тому же каждая зависимость - ключ словаря, массивы строятся одним проходом
+        по всем ребрам, без обработки каждой строки по отдельности.
+        """
+        # Словарь ids служит таблицей интернирования: каждое имя хранится один раз
+        ids: Dict[str, int] = dict(zip(map(sys.intern, graph), range(len(graph))))
+        if unique_rows:
+            try:
+                targets = array('i', map(ids.__getitem__, chain.from_iterable(graph.values())))
+            except KeyError:
+                pass
+            else:
+                offsets = array('q', [0])
+                offsets.extend(accumulate(map(len, graph.values())))
+                return cls(list(ids), offsets, targets, bytearray(b'\x01' * len(ids)), ids)
+        intern = ids.setdefault
+        offsets = array('q', [0])
+        targets = array('i')
+        for dependencies in graph.values():
+            targets.extend(dict.fromkeys([intern(dep, len(ids)) for dep in dependencies]))
+            offsets.append(len(targets))
+
+        rows = len(offsets) - 1
+        # Узлы, встречающиеся только как зависимости, получают пустые строки
+        offsets.extend([len(targets)] * (len(ids) - rows))
+        has_row = bytearray(len(ids))
+        has_row[:rows] = b'\x01' * rows
+        return cls(list(ids), offsets, targets, has_row, ids)
+
+    @property
+    def reverse_offsets(self) -> array:
+        return self._get_reverse()[0]
+
+    @property
+    def reverse_targets(self) -> array:
+        return self._get_reverse()[1]
+
+    def _get_reverse(self):
+        """Обратные массивы строятся лениво, при первом обращении"""
+        if self._reverse is None:
+            self._reverse = self._build_reverse()
+        return self._reverse
+
+    def _build_reverse(self):
+        """Построение обратных CSR-массивов сортировкой подсчетом"""
+        n = len(self.names)
+        counts = [0] * (n + 1)
+        for target in self.targets:
+            counts[target + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        reverse_offsets = array('q', counts)
+
+        reverse_targets = array('i', bytes(4 * len(self.targets)))
+        position = counts[:n]
+        offsets = self.offsets
+        targets = self.targets
+        for source in range(n):
+            for k in range(offsets[source], offsets[source + 1]):
+                target = targets[k]
+                reverse_targets[position[target]] = source
+                position[target] += 1
+        return reverse_offsets, reverse_targets
+
+    @property
+    def node_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def id_of(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def name_of(self, node_id: int) -> str:
+        return self.names[node_id]
+
+    def successors(self, node_id: int) -> array:
+        return self.targets[self.offsets[node_id]:self.offsets[node_id + 1]]
+
+    def predecessors(self, node_id: int) -> array:
+        return self.reverse_targets[self.reverse_offsets[node_id]:self.reverse_offsets[node_id + 1]]
+
+    def forward_view(self) -> 'AdjacencyView':
+        """Словарное представление прямых зависимостей"""
+        return AdjacencyView(self, reverse=False)
+
+    def reverse_view(self) -> 'AdjacencyView':
+        """Словарное представление обратных зависимостей"""
+        return AdjacencyView(self, reverse=True)
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return dict(self.forward_view().items())
+
+    def strongly_connected_components(self, roots: Iterable[int] = None) -> List[List[int]]:
+        """Итеративный алгоритм Тарьяна над CSR-массивами.
+
+        Если заданы корни, обходятся только достижимые из них узлы. Компоненты
+        возвращаются в обратном топологическом порядке.
+        """
+        n = len(self.names)
+        offsets = self.offsets
+        targets = self.targets
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+
+        for root in (range(n) if roots is None else roots):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [root]
+            positions = [offsets[root]]
+
+            while work:
+                node = work[-1]
+                position = positions[-1]
+                end = offsets[node + 1]
+                descended = False
+                while position < end:
+                    neighbor = targets[position]
+                    position += 1
+                    if index[neighbor] == -1:
+                        positions[-1] = position
+                        index[neighbor] = low[neighbor] = counter
+                        counter += 1
+                        stack.append(neighbor)
+                        on_stack[neighbor] = 1
+                        work.append(neighbor)
+                        positions.append(offsets[neighbor])
+                        descended = True
+                        break
+                    if on_stack[neighbor] and index[neighbor] < low[node]:
+                        low[node] = index[neighbor]
+                if descended:
+                    continue
+
+                work.pop()
+                positions.pop()
+                if work and low[node] < low[work[-1]]:
+                    low[work[-1]] = low[node]
+
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    component.reverse()
+                    components.append(component)
+
+        return components
+
+    def is_cyclic(self, component: List[int]) -> bool:
+        """Компонента циклична, если в ней больше одного узла или есть петля"""
+        if len(component) > 1:
+            return True
+        node = component[0]
+        targets = self.targets
+        for k in range(self.offsets[node], self.offsets[node + 1]):
+            if targets[k] == node:
+                return True
+        return False
+
+    def shortest_cycle(self, component: List[int]) -> List[int]:
+        """Кратчайший цикл через первый узел компоненты (поиск в ширину внутри компоненты)"""
+        start = component[0]
+        members = set(component)
+        parents = {start: -1}
+        queue = deque([start])
+
+        while queue:
+            node = queue.popleft()
+            for neighbor in self.successors(node):
+                if neighbor == start:
+                    cycle = []
+                    while node != -1:
+                        cycle.append(node)
+                        node = parents[node]
+                    cycle.reverse()
+                    return cycle
+                if neighbor in members and neighbor not in parents:
+                    parents[neighbor] = node
+                    queue.append(neighbor)
+
+        return [start]
+
+
+class AdjacencyView(Mapping):
+    """Представление CSR-массивов в виде словаря {пакет: [зависимости]}"""
+
+    def __init__(self, compact: CompactGraph, reverse: bool = False):
+        self.compact = compact
+        self.reverse = reverse
+
+    def _row(self, node_id: int) -> array:
+        if self.reverse:
+            return self.compact.predecessors(node_id)
+        return self.compact.successors(node_id)
+
+    def _has_key(self, node_id: int) -> bool:
+        if self.reverse:
+            return self.compact.reverse_offsets[node_id] != self.compact.reverse_offsets[node_id + 1]
+        return bool(self.compact.has_row[node_id])
+
+    def __getitem__(self, name: str) -> List[str]:
+        node_id = self.compact.id_of(name)
+        if node_id is None or not self._has_key(node_id):
+            raise KeyError(name)
+        names = self.compact.names
+        return [names[i] for i in self._row(node_id)]
+
+    def __contains__(self, name) -> bool:
+        node_id = self.compact.id_of(name)
+        return node_id is not None and self._has_key(node_id)
+
+    def __iter__(self):
+        names = self.compact.names
+        for node_id in range(self.compact.node_count):
+            if self._has_key(node_id):
+                yield names[node_id]
+
+    def items(self):
+        """Пары (пакет, зависимости) без поиска узла по имени"""
+        names = self.compact.names
+        for node_id in range(self.compact.node_count):
+            if self._has_key(node_id):
+                yield names[node_id], [names[i] for i in self._row(node_id)]
+
+    def __len__(self) -> int:
+        return sum(1 for node_id in range(self.compact.node_count) if self._has_key(node_id))
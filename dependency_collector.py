@@ -1,91 +1,471 @@
 import requests
 import json
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
 import time
+import threading
+import xmlrpc.client
+from email.parser import HeaderParser
+from urllib.parse import urljoin
+from xml.etree import ElementTree
+from metadata_cache import MetadataCache, normalize_name
+from metadata_store import MetadataStore
+from version_utils import is_prerelease, latest_version
+from repository_index import RepositoryFileIndex
+from metrics import Metrics
+from http_transport import HttpTransport, create_transport
+from requirements_parser import evaluate_marker, marker_uses_extra, parse_requirement, target_environment
+
+SIMPLE_JSON_ACCEPT = 'application/vnd.pypi.simple.v1+json'
+
+def _requires_dist(info: Dict) -> List[str]:
+    """requires_dist из JSON PyPI: для пакетов без зависимостей PyPI возвращает null"""
+    return info.get('requires_dist') or []
+
+class PackageNotFoundError(Exception):
+    """Пакета нет в репозитории (ответ 404): повторная загрузка не поможет"""
+
+def _fetch_error(package_name: str, message: str, error: requests.RequestException) -> Exception:
+    """Исключение для ошибки запроса: 404 - отсутствующий пакет, остальное - временная ошибка"""
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code == 404:
+        return PackageNotFoundError(f"Пакет {package_name} не найден в репозитории (404)")
+    return Exception(f"{message} {package_name}: {error}")
+
+def _filename_version(filename: str) -> Optional[str]:
+    """Извлечение версии из имени файла дистрибутива (wheel или sdist)"""
+    if filename.endswith('.whl'):
+        parts = filename[:-4].split('-')
+        return parts[1] if len(parts) >= 5 else None
+    for ext in ('.tar.gz', '.tar.bz2', '.tgz', '.zip'):
+        if filename.endswith(ext):
+            stem = filename[:-len(ext)]
+            return stem.rsplit('-', 1)[1] if '-' in stem else None
+    return None
 
 class DependencyCollector:
-    def __init__(self, repo_url: str = "https://pypi.org/pypi"):
+    def __init__(self, repo_url: str = "https://pypi.org/pypi", cache: MetadataCache = None,
+                 offline: bool = False, fetch_mode: str = "full", simple_url: str = None,
+                 test_repo_path: str = None, test_index_mode: str = "memory",
+                 metrics: Metrics = None, transport: HttpTransport = None,
+                 store: MetadataStore = None, environment: Dict[str, str] = None,
+                 extras: Dict[str, List[str]] = None):
         self.repo_url = repo_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'DependencyVisualizer/1.0'
-        })
+        self.cache = cache
+        # Локальное хранилище из дампа метаданных заменяет сетевые запросы
+        self.store = store
+        self.offline = offline
+        self.fetch_mode = fetch_mode
+        self.simple_url = simple_url.rstrip('/') if simple_url else None
+        self.test_repo_path = test_repo_path
+        self.test_index_mode = test_index_mode
+        self._test_indexes: Dict[str, RepositoryFileIndex] = {}
+        self._test_index_lock = threading.Lock()
+        # Версии, из которых взяты зависимости (используются при инкрементальном обновлении)
+        self.versions: Dict[str, str] = {}
+        self.metrics = metrics
+        # Пул соединений, таймауты, повторы и ограничение нагрузки на репозиторий
+        self.transport = transport or HttpTransport(
+            headers={'User-Agent': 'DependencyVisualizer/1.0'}, metrics=metrics
+        )
+        self.session = self.transport.session
+        # Окружение, для которого вычисляются маркеры requires_dist (по умолчанию - текущее)
+        self.environment = target_environment(environment)
+        # Запрошенные дополнения пакетов: из конфигурации и из требований вида pkg[extra]
+        self.requested_extras: Dict[str, Set[str]] = {
+            normalize_name(name): {normalize_name(extra) for extra in package_extras}
+            for name, package_extras in (extras or {}).items()
+        }
+        self._extras_lock = threading.Lock()
+        # requires_dist пакетов с требованиями под маркером extra и дополнения, с которыми
+        # вычислены их зависимости: при новых дополнениях зависимости пересчитываются
+        self._extras_requirements: Dict[str, List[str]] = {}
+        self._extracted_extras: Dict[str, frozenset] = {}
+        self._extras_pending: Set[str] = set()
     
-    def get_package_info(self, package_name: str) -> Dict:
-        """Получение информации о пакете из PyPI"""
+    def get_package_info(self, package_name: str, revalidate: bool = False) -> Dict:
+        """Получение информации о пакете из PyPI; revalidate - проверить запись кэша даже до истечения TTL"""
         try:
             url = f"{self.repo_url}/{package_name}/json"
-            response = self.session.get(url)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, normalize_name(package_name), revalidate=revalidate)
+        except requests.RequestException as e:
+            raise _fetch_error(package_name, "Ошибка при получении информации о пакете", e)
+    
+    def _count(self, name: str, value: float = 1):
+        if self.metrics:
+            self.metrics.increment(name, value)
+    
+    def _http_get(self, url: str, headers: Dict = None):
+        """HTTP GET с учетом числа запросов, объема и задержки"""
+        start = time.perf_counter()
+        response = self.transport.get(url, headers=headers)
+        if self.metrics:
+            elapsed = time.perf_counter() - start
+            self.metrics.increment('http.requests')
+            self.metrics.increment('http.bytes', len(response.content))
+            self.metrics.increment(f'http.status.{response.status_code}')
+            self.metrics.observe('http.latency_ms', elapsed * 1000)
+            self.metrics.span('GET', start, elapsed, 'http')
+        return response
+    
+    def _decode_json(self, response) -> Dict:
+        """Разбор JSON-ответа с учетом времени декодирования"""
+        start = time.perf_counter()
+        data = response.json()
+        if self.metrics:
+            elapsed = time.perf_counter() - start
+            self.metrics.increment('json.decode_seconds', elapsed)
+            self.metrics.observe('json.decode_ms', elapsed * 1000)
+        return data
+    
+    def _get_json(self, url: str, cache_key: str, headers: Dict = None, revalidate: bool = False) -> Dict:
+        """Загрузка JSON с использованием кэша и условных запросов (ETag/Last-Modified).
+        
+        При revalidate свежая по TTL запись не возвращается сразу, а проверяется
+        условным запросом (ответ 304 стоит одного запроса без тела).
+        """
+        entry = self.cache.get(cache_key) if self.cache else None
+        if entry and not revalidate and self.cache.is_fresh(entry):
+            self._count('cache.hit')
+            return entry.data
+        
+        # В режиме offline допускаются устаревшие записи, но не сетевые запросы
+        if self.offline:
+            if entry:
+                self._count('cache.hit')
+                return entry.data
+            self._count('cache.miss')
+            raise Exception(f"{cache_key} отсутствует в кэше (режим offline)")
+        
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.etag:
+                request_headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                request_headers['If-Modified-Since'] = entry.last_modified
+        
+        if self.cache:
+            self._count('cache.revalidate' if entry else 'cache.miss')
+        response = self._http_get(url, headers=request_headers)
+        if response.status_code == 304 and entry:
+            self._count('cache.not_modified')
+            self.cache.touch(cache_key)
+            return entry.data
+        response.raise_for_status()
+        data = self._decode_json(response)
+        
+        if self.cache:
+            self.cache.put(cache_key, data, response.headers.get('ETag'),
+                           response.headers.get('Last-Modified'))
+        return data
+    
+    def get_package_metadata(self, package_name: str) -> Dict:
+        """Облегченное получение метаданных последней версии пакета (без карты releases)"""
+        name = normalize_name(package_name)
+        try:
+            version, files, requires_dist = self._get_latest_release(name)
+            
+            # Метаданные опубликованной версии неизменны, поэтому TTL к ним не применяется
+            cache_key = f"{name}=={version}"
+            entry = self.cache.get(cache_key) if self.cache else None
+            if entry:
+                self._count('cache.hit')
+                return entry.data
+            if self.cache:
+                self._count('cache.miss')
+            if self.offline:
+                raise Exception(f"{cache_key} отсутствует в кэше (режим offline)")
+            
+            if requires_dist is None:
+                metadata_url = self._select_metadata_url(files)
+                if metadata_url:
+                    requires_dist = self._get_core_metadata(metadata_url)
+            if requires_dist is None:
+                # Эндпоинт конкретной версии не содержит карту releases
+                response = self._http_get(f"{self.repo_url}/{name}/{version}/json")
+                response.raise_for_status()
+                info = self._decode_json(response)['info']
+                requires_dist = _requires_dist(info)
+            
+            metadata = {'name': name, 'version': version, 'requires_dist': requires_dist}
+            if self.cache:
+                self.cache.put(cache_key, metadata)
+            return metadata
         except requests.RequestException as e:
-            raise Exception(f"Ошибка при получении информации о пакете {package_name}: {e}")
+            raise _fetch_error(package_name, "Ошибка при получении метаданных пакета", e)
+    
+    def _get_latest_release(self, name: str, revalidate: bool = False) -> Tuple[str, List[Dict], Optional[List[str]]]:
+        """Определение последней версии пакета и списка ее файлов.
+        
+        Третий элемент - requires_dist, если версия взята из полного JSON
+        (повторно запрашивать метаданные версии не нужно), иначе None.
+        При revalidate запись кэша не используется, даже если она свежая по TTL.
+        """
+        cache_key = f"latest:{name}"
+        entry = self.cache.get(cache_key) if self.cache else None
+        if entry and (self.offline or (not revalidate and self.cache.is_fresh(entry))):
+            self._count('cache.hit')
+            return entry.data['version'], entry.data['files'], None
+        if self.cache:
+            self._count('cache.miss')
+        if self.offline:
+            raise Exception(f"{name} отсутствует в кэше (режим offline)")
+        
+        if self.simple_url:
+            version, files = self._get_release_from_simple_index(name)
+        else:
+            version, files = self._get_release_from_feed(name), []
+        
+        # Если облегченные источники недоступны, берем версию и зависимости из полного JSON
+        requires_dist = None
+        if version is None:
+            info = self.get_package_info(name, revalidate)['info']
+            version, files = info['version'], []
+            requires_dist = _requires_dist(info)
+        
+        if self.cache:
+            self.cache.put(cache_key, {'version': version, 'files': files})
+        return version, files, requires_dist
+    
+    def _get_release_from_simple_index(self, name: str) -> Tuple[Optional[str], List[Dict]]:
+        """Последняя версия и ее файлы из JSON simple-индекса (PEP 691/700)"""
+        response = self._http_get(f"{self.simple_url}/{name}/", headers={'Accept': SIMPLE_JSON_ACCEPT})
+        response.raise_for_status()
+        page = self._decode_json(response)
+        
+        files_by_version = {}
+        for file in page.get('files', []):
+            file_version = _filename_version(file['filename'])
+            if file_version and not file.get('yanked'):
+                files_by_version.setdefault(file_version, []).append(file)
+        
+        versions = [v for v in page.get('versions', files_by_version) if v in files_by_version]
+        version = latest_version(versions)
+        files = []
+        for file in files_by_version.get(version, []):
+            core_metadata = (file.get('core-metadata') or file.get('data-dist-info-metadata')
+                             or file.get('dist-info-metadata'))
+            files.append({
+                'filename': file['filename'],
+                'url': urljoin(response.url, file['url']),
+                'core_metadata': bool(core_metadata)
+            })
+        return version, files
+    
+    def _get_release_from_feed(self, name: str) -> Optional[str]:
+        """Последняя стабильная версия из RSS-ленты релизов PyPI"""
+        base_url = self.repo_url[:-len('/pypi')] if self.repo_url.endswith('/pypi') else self.repo_url
+        try:
+            response = self._http_get(f"{base_url}/rss/project/{name}/releases.xml")
+            response.raise_for_status()
+            root = ElementTree.fromstring(response.content)
+        except (requests.RequestException, ElementTree.ParseError):
+            return None
+        
+        # Лента содержит только последние релизы: если среди них нет стабильных,
+        # последнюю версию определяем по полному JSON
+        version = latest_version(item.findtext('title', '') for item in root.iter('item'))
+        if version is None or is_prerelease(version):
+            return None
+        return version
+    
+    def _select_metadata_url(self, files: List[Dict]) -> Optional[str]:
+        """Выбор файла с отдельными метаданными (PEP 658), предпочтительно wheel"""
+        candidates = [f for f in files if f['core_metadata']]
+        candidates.sort(key=lambda f: not f['filename'].endswith('.whl'))
+        return candidates[0]['url'] if candidates else None
+    
+    def _get_core_metadata(self, file_url: str) -> List[str]:
+        """Загрузка файла METADATA и разбор только заголовков Requires-Dist"""
+        response = self._http_get(file_url.split('#', 1)[0] + '.metadata')
+        response.raise_for_status()
+        headers = HeaderParser().parsestr(response.text)
+        return headers.get_all('Requires-Dist') or []
+    
+    def _extract_dependencies(self, requires_dist: List[str], package_name: str) -> List[str]:
+        """Имена пакетов из requires_dist, которые будут установлены в целевом окружении.
+
+        Требования с невыполненным маркером (другая версия Python, платформа или
+        незапрошенное дополнение) пропускаются. Дополнения из требований вида
+        pkg[extra] запоминаются за pkg; если pkg уже загружен, он попадает
+        в pop_extras_updates с пересчитанными зависимостями. Требования пакета
+        к самому себе (dask[array]; extra == 'complete') расширяют его активные
+        дополнения, пока их набор не перестанет меняться.
+        """
+        package_key = normalize_name(package_name)
+        with self._extras_lock:
+            requested = frozenset(self.requested_extras.get(package_key, ()))
+        requirements = [requirement for requirement in map(parse_requirement, requires_dist or [])
+                        if requirement is not None]
+        uses_extras = any(marker_uses_extra(requirement.marker) for requirement in requirements)
+
+        extras = requested
+        while True:
+            added = frozenset().union(*(
+                requirement.extras for requirement in requirements
+                if requirement.name == package_key and not requirement.extras <= extras
+                and evaluate_marker(requirement.marker, self.environment, extras)
+            ))
+            if not added:
+                break
+            extras |= added
+
+        dependencies = []
+        for requirement in requirements:
+            if requirement.name == package_key:
+                continue
+            if not evaluate_marker(requirement.marker, self.environment, extras):
+                self._count('requirements.skipped')
+                continue
+            if requirement.extras:
+                self._request_extras(requirement.name, requirement.extras)
+            if requirement.name not in dependencies:
+                dependencies.append(requirement.name)
+
+        if uses_extras:
+            with self._extras_lock:
+                self._extras_requirements[package_key] = list(requires_dist)
+                self._extracted_extras[package_key] = requested
+                # Дополнения, запрошенные другим потоком во время разбора
+                if not self.requested_extras.get(package_key, set()) <= requested:
+                    self._extras_pending.add(package_key)
+        return dependencies
+
+    def _request_extras(self, package_key: str, extras: frozenset):
+        with self._extras_lock:
+            requested = self.requested_extras.setdefault(package_key, set())
+            if extras <= requested:
+                return
+            requested.update(extras)
+            if package_key in self._extracted_extras:
+                self._extras_pending.add(package_key)
+
+    def pop_extras_updates(self) -> Dict[str, List[str]]:
+        """Пересчитанные зависимости уже загруженных пакетов, для которых запрошены новые дополнения"""
+        with self._extras_lock:
+            pending, self._extras_pending = self._extras_pending, set()
+        return {package_key: self._extract_dependencies(self._extras_requirements[package_key], package_key)
+                for package_key in pending}
+    
+    def package_key(self, package_name: str) -> str:
+        """Имя пакета в графе: нормализованное по PEP 503, как у зависимостей (в тестовом репозитории - как задано)"""
+        return package_name if self.test_repo_path else normalize_name(package_name)
     
     def get_direct_dependencies(self, package_name: str) -> List[str]:
         """Получение прямых зависимостей пакета"""
+        if self.test_repo_path:
+            return self.collect_from_test_file(self.test_repo_path, package_name)
+        
+        if self.store:
+            record = self.store.get(package_name)
+            if record is None:
+                raise PackageNotFoundError(f"Пакет {package_name} отсутствует в локальном хранилище метаданных")
+            self.versions[package_name] = record['version']
+            return self._extract_dependencies(record['requires_dist'], package_name)
+        
+        if self.fetch_mode == 'lean':
+            metadata = self.get_package_metadata(package_name)
+            self.versions[package_name] = metadata['version']
+            return self._extract_dependencies(metadata['requires_dist'], package_name)
+        
         package_info = self.get_package_info(package_name)
         
         # Получаем последнюю версию
         latest_version = package_info['info']['version']
+        self.versions[package_name] = latest_version
         
         # Ищем зависимости в информации о релизах
-        dependencies = set()
-        
-        if latest_version in package_info.get('releases', {}):
-            releases = package_info['releases'][latest_version]
-            for release in releases:
-                requires_dist = release.get('requires_dist', [])
-                if requires_dist:
-                    for dep in requires_dist:
-                        # Извлекаем имя пакета (убираем версии и дополнительные условия)
-                        dep_name = dep.split(' ')[0].strip()
-                        if dep_name and not dep_name.startswith('python_') and dep_name != package_name:
-                            dependencies.add(dep_name)
+        requires_dist = []
+        for release in package_info.get('releases', {}).get(latest_version, []):
+            requires_dist.extend(_requires_dist(release))
         
         # Если не нашли в релизах, проверяем в общей информации
-        if not dependencies:
-            requires_dist = package_info['info'].get('requires_dist', [])
-            for dep in requires_dist:
-                dep_name = dep.split(' ')[0].strip()
-                if dep_name and not dep_name.startswith('python_') and dep_name != package_name:
-                    dependencies.add(dep_name)
+        if not requires_dist:
+            requires_dist = _requires_dist(package_info['info'])
+        
+        return self._extract_dependencies(requires_dist, package_name)
+    
+    def get_latest_version(self, package_name: str) -> Optional[str]:
+        """Текущая последняя версия пакета (None для тестового репозитория).
         
-        return list(dependencies)
+        Используется для поиска изменившихся пакетов, поэтому TTL кэша не
+        применяется: иначе новый релиз не был бы замечен до истечения записи.
+        """
+        if self.test_repo_path:
+            return None
+        if self.store:
+            record = self.store.get(package_name)
+            return record['version'] if record else None
+        if self.fetch_mode == 'lean':
+            try:
+                return self._get_latest_release(normalize_name(package_name), revalidate=True)[0]
+            except requests.RequestException as e:
+                raise Exception(f"Ошибка при получении версии пакета {package_name}: {e}")
+        return self.get_package_info(package_name, revalidate=True)['info']['version']
+    
+    def get_last_serial(self) -> Optional[int]:
+        """Текущий серийный номер журнала изменений PyPI (None, если журнал недоступен)"""
+        if self.test_repo_path or self.offline or self.store:
+            return None
+        try:
+            return self.transport.xmlrpc_proxy(self.repo_url).changelog_last_serial()
+        except (xmlrpc.client.Error, OSError):
+            return None
+    
+    def get_changed_packages(self, since_serial: int) -> Optional[Set[str]]:
+        """Нормализованные имена пакетов, изменившихся после заданного серийного номера"""
+        if self.test_repo_path or self.offline or self.store:
+            return None
+        try:
+            changes = self.transport.xmlrpc_proxy(self.repo_url).changelog_since_serial(since_serial)
+        except (xmlrpc.client.Error, OSError):
+            return None
+        return {normalize_name(change[0]) for change in changes}
+    
+    def invalidate(self, package_name: str):
+        """Удаление метаданных пакета из кэша, чтобы следующий запрос получил свежие данные"""
+        if self.cache:
+            name = normalize_name(package_name)
+            self.cache.delete(name)
+            self.cache.delete(f"latest:{name}")
     
     def collect_from_test_file(self, file_path: str, package_name: str) -> List[str]:
         """Сбор зависимостей из тестового файла"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Простой парсинг тестового файла с зависимостями
-            dependencies = []
-            lines = content.strip().split('\n')
-            
-            for line in lines:
-                if '->' in line:
-                    parts = line.split('->')
-                    if parts[0].strip() == package_name:
-                        dependencies.append(parts[1].strip())
-            
-            return dependencies
+            return self._get_test_index(file_path).get_dependencies(package_name)
         except Exception as e:
             raise Exception(f"Ошибка чтения тестового файла: {e}")
+    
+    def _get_test_index(self, file_path: str) -> RepositoryFileIndex:
+        """Индекс тестового файла строится один раз и переиспользуется для всех пакетов"""
+        index = self._test_indexes.get(file_path)
+        if index is None:
+            with self._test_index_lock:
+                index = self._test_indexes.get(file_path)
+                if index is None:
+                    index = RepositoryFileIndex(file_path, self.test_index_mode)
+                    self._test_indexes[file_path] = index
+        return index
 
-def collect_dependencies_stage(config: Dict) -> List[str]:
-    """Этап 2: Сбор прямых зависимостей"""
-    collector = DependencyCollector(config['repo_url'])
-    
-    if config.get('test_mode', False):
-        dependencies = collector.collect_from_test_file(
-            config['test_repo_path'], 
-            config['package_name']
+def create_collector(config: Dict, metrics: Metrics = None) -> DependencyCollector:
+    """Создание сборщика зависимостей по конфигурации"""
+    cache = None
+    if config.get('cache_dir'):
+        cache = MetadataCache(
+            config['cache_dir'],
+            ttl=config.get('cache_ttl', 24 * 3600),
+            max_size_mb=config.get('cache_max_size_mb', 512)
         )
-    else:
-        dependencies = collector.get_direct_dependencies(config['package_name'])
-    
-    print(f"Прямые зависимости пакета '{config['package_name']}':")
-    for i, dep in enumerate(dependencies, 1):
-        print(f"  {i}. {dep}")
-    
-    return dependencies
\ No newline at end of file
+    return DependencyCollector(
+        config['repo_url'],
+        cache=cache,
+        offline=config.get('offline', False),
+        fetch_mode=config.get('fetch_mode', 'full'),
+        simple_url=config.get('simple_url'),
+        test_repo_path=config['test_repo_path'] if config.get('test_mode', False) else None,
+        test_index_mode=config.get('test_index_mode', 'memory'),
+        metrics=metrics,
+        transport=create_transport(config, metrics),
+        store=MetadataStore(config['metadata_store']) if config.get('metadata_store') else None,
+        environment=config.get('target_environment'),
+        extras={config['package_name']: config['extras']} if config.get('extras') else None
+    )
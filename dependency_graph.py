@@ -1,6 +1,15 @@
-from typing import Dict, List, Set, Tuple
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Set, Tuple
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
 import time
+from compact_graph import CompactGraph
+from dependency_collector import PackageNotFoundError
+from graph_algorithms import as_compact, cyclic_components
+from graph_snapshot import load_snapshot, save_snapshot
+from metadata_cache import normalize_name
+from metrics import Metrics
 
 class DependencyGraph:
     def __init__(self, collector):
@@ -8,12 +17,96 @@ class DependencyGraph:
         self.graph: Dict[str, List[str]] = {}
         self.visited: Set[str] = set()
         self.cycles: List[List[str]] = []
+        self.components: List[List[str]] = []
+        self.roots: List[str] = []
+        # Пакеты, загрузка которых завершилась ошибкой, и их глубина в обходе
+        self.failed: Dict[str, int] = {}
+        # Пакеты из failed, которых нет в репозитории: в повторной загрузке они не участвуют
+        self.not_found: Set[str] = set()
+        # Глубина загруженных пакетов - кратчайшее расстояние от корней
+        self.depths: Dict[str, int] = {}
+        # Версии пакетов из загруженного снимка (для двоичного - представление над mmap)
+        self.snapshot_versions: Mapping = {}
+        # Компактное представление, общее для поиска циклов и операций над графом;
+        # сбрасывается при каждом изменении графа
+        self._compact: CompactGraph = None
     
     def build_graph_dfs(self, start_package: str, max_depth: int = None) -> Dict[str, List[str]]:
         """Построение графа зависимостей с помощью DFS без рекурсии"""
-        stack = [(start_package, 0)]  # (package, current_depth)
+        return self.build_graph_multi([start_package], max_depth)
+    
+    def build_graph_concurrent(self, start_package: str, max_depth: int = None,
+                               max_workers: int = 8) -> Dict[str, List[str]]:
+        """Построение графа зависимостей с параллельной загрузкой всего фронта обхода"""
+        return self.build_graph_multi([start_package], max_depth, max_workers)
+    
+    def build_graph_multi(self, roots: List[str], max_depth: int = None,
+                          max_workers: int = 1) -> Dict[str, List[str]]:
+        """Построение общего графа для нескольких корневых пакетов за один обход"""
+        for _ in self.iter_graph_multi(roots, max_depth, max_workers):
+            pass
+        return self.graph
+    
+    def iter_graph_multi(self, roots: List[str], max_depth: int = None,
+                         max_workers: int = 1) -> Iterator[Tuple[str, List[str]]]:
+        """Потоковое построение графа: пакеты выдаются вместе с прямыми зависимостями
+        сразу после загрузки, граф при этом дополняется как в build_graph_multi"""
         self.graph = {}
         self.visited = set()
+        self.failed = {}
+        self.not_found = set()
+        self.depths = {}
+        self.roots = self.root_keys(roots)
+        yield from self._iter_crawl(self.roots, max_depth, max_workers)
+        yield from self._iter_retry_failed(max_depth, max_workers)
+    
+    def root_keys(self, roots: List[str]) -> List[str]:
+        """Корневые пакеты под теми же именами, что и зависимости в графе, без повторов"""
+        return list(dict.fromkeys(self.collector.package_key(root) for root in roots))
+    
+    def _iter_crawl(self, roots: List[str], max_depth: int = None, max_workers: int = 1,
+                    start_depth: int = 0) -> Iterator[Tuple[str, List[str]]]:
+        """Обход от заданных пакетов: параллельный по уровням или последовательный DFS"""
+        self._compact = None
+        if max_workers > 1:
+            return self._iter_frontier(roots, max_depth, max_workers, start_depth)
+        return self._iter_dfs(roots, max_depth, start_depth)
+    
+    def _iter_retry_failed(self, max_depth: int = None,
+                           max_workers: int = 1) -> Iterator[Tuple[str, List[str]]]:
+        """Повторный обход пакетов, загрузка которых завершилась ошибкой.
+        
+        Транспорт уже повторял отдельные запросы; здесь пакеты загружаются
+        еще раз после основного обхода, когда нагрузка на репозиторий спала.
+        Пакеты, которых нет в репозитории (404), остаются в failed без повтора.
+        """
+        failed = {package: depth for package, depth in self.failed.items() if package not in self.not_found}
+        if not failed:
+            return
+        self.failed = {package: depth for package, depth in self.failed.items() if package in self.not_found}
+        print(f" Повторная загрузка пакетов с ошибками: {len(failed)}")
+        by_depth: Dict[int, List[str]] = {}
+        for package, depth in failed.items():
+            self.visited.discard(package)
+            by_depth.setdefault(depth, []).append(package)
+        for depth in sorted(by_depth):
+            yield from self._iter_crawl(by_depth[depth], max_depth, max_workers, depth)
+        if self.failed:
+            print(f" Не удалось загрузить пакеты: {', '.join(sorted(self.failed))}")
+    
+    def _iter_dfs(self, roots: List[str], max_depth: int = None,
+                  start_depth: int = 0) -> Iterator[Tuple[str, List[str]]]:
+        """Последовательный обход DFS с дополнением текущего графа.
+        
+        Глубина пакета - кратчайшее расстояние от корней, как при обходе по уровням:
+        если загруженный пакет позже достигнут ближе к корню, его зависимости
+        обходятся повторно с меньшей глубины. Поэтому при max_depth граф совпадает
+        с графом параллельного обхода.
+        
+        Если для загруженного пакета позже запрошены новые дополнения (pkg[extra]),
+        пакет выдается повторно только с добавленными зависимостями.
+        """
+        stack = [(root, start_depth) for root in reversed(roots)]  # (package, current_depth)
         
         while stack:
             current_package, depth = stack.pop()
@@ -22,89 +115,357 @@ class DependencyGraph:
             if max_depth and depth >= max_depth:
                 continue
             
-            if current_package not in self.visited:
-                self.visited.add(current_package)
+            if current_package in self.visited:
+                if max_depth and depth < self.depths.get(current_package, depth):
+                    self.depths[current_package] = depth
+                    if current_package in self.failed:
+                        self.failed[current_package] = depth
+                    else:
+                        stack.extend((dep, depth + 1) for dep in self.graph.get(current_package, []))
+                continue
+            
+            self.visited.add(current_package)
+            self.depths[current_package] = depth
+            
+            # Получаем зависимости текущего пакета
+            try:
+                if current_package not in self.graph:
+                    self.graph[current_package] = []
                 
-                # Получаем зависимости текущего пакета
-                try:
-                    if current_package not in self.graph:
-                        self.graph[current_package] = []
-                    
-                    dependencies = self.collector.get_direct_dependencies(current_package)
+                dependencies = self.collector.get_direct_dependencies(current_package)
+                
+                # Повторяющиеся зависимости не дублируют ребра графа
+                for dep in dict.fromkeys(dependencies):
+                    self.graph[current_package].append(dep)
                     
-                    for dep in dependencies:
-                        self.graph[current_package].append(dep)
+                    # Добавляем зависимость в стек для дальнейшего обхода; при max_depth
+                    # загруженные зависимости тоже, чтобы уточнить их глубину
+                    if dep not in self.visited or max_depth:
+                        stack.append((dep, depth + 1))
                         
-                        # Добавляем зависимость в стек для дальнейшего обхода
-                        if dep not in self.visited:
-                            stack.append((dep, depth + 1))
-                            
-                except Exception as e:
-                    print(f" Предупреждение: не удалось получить зависимости для {current_package}: {e}")
-                    continue
+            except Exception as e:
+                print(f" Предупреждение: не удалось получить зависимости для {current_package}: {e}")
+                self.failed[current_package] = depth
+                if isinstance(e, PackageNotFoundError):
+                    self.not_found.add(current_package)
+                continue
+            
+            yield current_package, self.graph[current_package]
+            
+            for package, added in self._extras_updates():
+                yield package, added
+                stack.extend((dep, self.depths.get(package, 0) + 1) for dep in added)
+    
+    def _extras_updates(self) -> List[Tuple[str, List[str]]]:
+        """Зависимости, добавленные загруженным пакетам из-за дополнений, запрошенных позже.
         
-        return self.graph
+        Списки зависимостей в графе дополняются на месте; возвращаются пары
+        (пакет, добавленные зависимости).
+        """
+        updates = []
+        for package, dependencies in self.collector.pop_extras_updates().items():
+            if package not in self.graph or package in self.failed:
+                continue
+            added = [dep for dep in dependencies if dep not in self.graph[package]]
+            if added:
+                self.graph[package].extend(added)
+                updates.append((package, added))
+        return updates
     
-    def detect_cycles(self) -> List[List[str]]:
-        """Обнаружение циклических зависимостей"""
-        self.cycles = []
-        visited = set()
-        recursion_stack = set()
-        path = []
+    def _iter_frontier(self, roots: List[str], max_depth: int = None, max_workers: int = 8,
+                       start_depth: int = 0) -> Iterator[Tuple[str, List[str]]]:
+        """Параллельный обход по уровням с дополнением текущего графа.
         
-        def dfs_cycle_detection(node):
-            if node in recursion_stack:
-                # Найден цикл
-                cycle_start = path.index(node)
-                cycle = path[cycle_start:]
-                if cycle not in self.cycles:
-                    self.cycles.append(cycle)
-                return
-            
-            if node in visited:
-                return
-            
-            visited.add(node)
-            recursion_stack.add(node)
-            path.append(node)
-            
-            for neighbor in self.graph.get(node, []):
-                if neighbor in self.graph:  # Проверяем только пакеты, которые есть в графе
-                    dfs_cycle_detection(neighbor)
-            
-            path.pop()
-            recursion_stack.remove(node)
+        Как и в _iter_dfs, загруженный пакет, достигнутый ближе к корню, не
+        загружается заново: уточняется его глубина и повторно обходятся его зависимости.
+        """
+        frontier = list(dict.fromkeys(roots))
+        depth = start_depth
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while frontier:
+                # Проверка максимальной глубины (глубина узла - кратчайшее расстояние от корня)
+                if max_depth and depth >= max_depth:
+                    break
+                
+                next_frontier = []
+                queued = set()
+                
+                def enqueue(dependencies):
+                    for dep in dependencies:
+                        if dep in queued:
+                            continue
+                        if dep not in self.visited or (max_depth and self.depths.get(dep, 0) > depth + 1):
+                            queued.add(dep)
+                            next_frontier.append(dep)
+                
+                revisited = [package for package in frontier if package in self.visited]
+                frontier = [package for package in frontier if package not in self.visited]
+                for package in revisited:
+                    if depth < self.depths.get(package, depth):
+                        self.depths[package] = depth
+                        if package in self.failed:
+                            self.failed[package] = depth
+                        else:
+                            enqueue(self.graph.get(package, []))
+                
+                self.visited.update(frontier)
+                self.depths.update(dict.fromkeys(frontier, depth))
+                # Запросы ко всем пакетам фронта выполняются параллельно,
+                # число одновременных запросов ограничено max_workers
+                futures = [executor.submit(self.collector.get_direct_dependencies, package)
+                           for package in frontier]
+                
+                for package, future in zip(frontier, futures):
+                    self.graph[package] = []
+                    try:
+                        dependencies = future.result()
+                    except Exception as e:
+                        print(f" Предупреждение: не удалось получить зависимости для {package}: {e}")
+                        self.failed[package] = depth
+                        if isinstance(e, PackageNotFoundError):
+                            self.not_found.add(package)
+                        continue
+                    
+                    self.graph[package].extend(dict.fromkeys(dependencies))
+                    enqueue(self.graph[package])
+                    yield package, self.graph[package]
+                
+                # Зависимости пакетов текущего уровня идут в следующий фронт,
+                # пакетов ближе к корню - обходятся сразу со своей глубины
+                for package, added in self._extras_updates():
+                    yield package, added
+                    package_depth = self.depths.get(package, depth)
+                    if package_depth == depth:
+                        enqueue(added)
+                    else:
+                        yield from self._iter_frontier(added, max_depth, max_workers, package_depth + 1)
+                
+                frontier = next_frontier
+                depth += 1
+    
+    def refresh_graph(self, snapshot: Dict, max_depth: int = None, max_workers: int = 1) -> Set[str]:
+        """Инкрементальное обновление графа из снимка: повторно загружаются только изменившиеся пакеты"""
+        self._compact = None
+        self.graph = {package: list(deps) for package, deps in snapshot['graph'].items()}
+        self.visited = set(self.graph)
+        self.roots = self.root_keys(snapshot['roots'])
+        self.collector.versions.update(snapshot.get('versions', {}))
         
-        for node in self.graph:
-            if node not in visited:
-                dfs_cycle_detection(node)
+        changed = self._find_changed_packages(snapshot, max_workers)
+        # Пакеты, загрузка которых в прошлый раз завершилась ошибкой, загружаются повторно
+        changed |= {package for package in snapshot.get('failed', {}) if package in self.graph}
+        still_failed = set()
+        for package, result in self._map_collector(
+                self.collector.get_direct_dependencies, changed, max_workers).items():
+            if isinstance(result, Exception):
+                print(f" Предупреждение: не удалось обновить зависимости для {package}: {result}")
+                still_failed.add(package)
+            else:
+                self.graph[package] = list(dict.fromkeys(result))
+        # Изменившиеся пакеты могли запросить новые дополнения у загруженных пакетов
+        expanded = changed | {package for package, _ in self._extras_updates()}
         
+        # Новые зависимости изменившихся пакетов обходятся с их фактической глубины
+        depths = self._depths()
+        self.depths = dict(depths)
+        new_by_depth: Dict[int, List[str]] = {}
+        for package in expanded:
+            for dep in self.graph[package]:
+                if dep not in self.visited:
+                    new_by_depth.setdefault(depths.get(package, 0) + 1, []).append(dep)
+        self.failed = {}
+        self.not_found = set()
+        for depth in sorted(new_by_depth):
+            for _ in self._iter_crawl(new_by_depth[depth], max_depth, max_workers, depth):
+                pass
+        for _ in self._iter_retry_failed(max_depth, max_workers):
+            pass
+        # Зависимости из снимка сохраняются, а пакет остается в списке для следующего обновления
+        for package in still_failed:
+            self.failed.setdefault(package, depths.get(package, 0))
+        
+        # Пакеты, которые больше недостижимы из корней, удаляются
+        reachable = self._depths()
+        for package in [p for p in self.graph if p not in reachable]:
+            del self.graph[package]
+            self.failed.pop(package, None)
+        self.visited = set(self.graph)
+        return changed
+    
+    def _find_changed_packages(self, snapshot: Dict, max_workers: int = 1) -> Set[str]:
+        """Определение изменившихся пакетов по журналу изменений PyPI или по версиям"""
+        changed_names = None
+        if snapshot.get('serial') is not None:
+            changed_names = self.collector.get_changed_packages(snapshot['serial'])
+        
+        if changed_names is not None:
+            changed = {package for package in self.graph if normalize_name(package) in changed_names}
+            for package in changed:
+                self.collector.invalidate(package)
+            return changed
+        
+        # Журнал недоступен: сравниваем последние версии со снимком
+        old_versions = snapshot.get('versions', {})
+        changed = set()
+        for package, version in self._map_collector(
+                self.collector.get_latest_version, list(self.graph), max_workers).items():
+            if isinstance(version, Exception):
+                continue
+            if version is None or version != old_versions.get(package):
+                changed.add(package)
+        return changed
+    
+    def _map_collector(self, func, packages, max_workers: int = 1) -> Dict:
+        """Вызов метода сборщика для списка пакетов; ошибки возвращаются как значения"""
+        def call(package):
+            try:
+                return func(package)
+            except Exception as e:
+                return e
+        
+        packages = list(packages)
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return dict(zip(packages, executor.map(call, packages)))
+        return {package: call(package) for package in packages}
+    
+    def _depths(self) -> Dict[str, int]:
+        """Кратчайшая глубина каждого узла графа от корней (поиск в ширину)"""
+        depths = {root: 0 for root in self.roots if root in self.graph}
+        queue = deque(depths)
+        while queue:
+            package = queue.popleft()
+            for dep in self.graph[package]:
+                if dep in self.graph and dep not in depths:
+                    depths[dep] = depths[package] + 1
+                    queue.append(dep)
+        return depths
+    
+    def subgraph(self, root: str) -> Dict[str, List[str]]:
+        """Часть общего графа, достижимая из заданного корня"""
+        result = {}
+        stack = [root]
+        while stack:
+            package = stack.pop()
+            if package in result or package not in self.graph:
+                continue
+            result[package] = self.graph[package]
+            stack.extend(dep for dep in self.graph[package] if dep not in result)
+        return result
+    
+    def detect_cycles(self) -> List[List[str]]:
+        """Обнаружение циклических зависимостей через компоненты сильной связности"""
+        # Для каждой циклической компоненты приводится один представительный цикл
+        found = cyclic_components(self.to_compact())
+        self.components = [component for component, _ in found]
+        self.cycles = [cycle for _, cycle in found]
         return self.cycles
+    
+    def to_compact(self) -> CompactGraph:
+        """Компактное целочисленное представление построенного графа.
+        
+        Строится один раз после обхода и передается поиску циклов, операциям,
+        аналитике и упрощению графа; граф из двоичного снимка уже хранится в CSR-массивах.
+        """
+        if self._compact is None:
+            # Обход не добавляет повторяющихся ребер, поэтому строки не проверяются на повторы
+            self._compact = as_compact(self.graph, unique_rows=True)
+        return self._compact
+    
+    def save_snapshot(self, file_path: str, binary: bool = True, serial: int = None):
+        """Сохранение построенного графа, версий пакетов и найденных циклов в снимок"""
+        save_snapshot(file_path, self.graph, self.roots, self.package_versions(), serial, binary, self.failed)
+    
+    def package_versions(self) -> Dict[str, str]:
+        """Версии пакетов графа: загруженные в этом процессе, для остальных - из снимка"""
+        loaded = self.collector.versions if self.collector else {}
+        versions = {}
+        for package in self.graph:
+            version = loaded.get(package) or self.snapshot_versions.get(package)
+            if version:
+                versions[package] = version
+        return versions
+    
+    def load_snapshot(self, file_path: str) -> Dict:
+        """Загрузка графа из снимка без обхода.
+        
+        Граф из двоичного снимка доступен только для чтения и отображен в память;
+        циклы берутся из снимка, для JSON-снимка они вычисляются заново.
+        """
+        snapshot = load_snapshot(file_path)
+        self._compact = None
+        self.graph = snapshot['graph']
+        self.roots = list(snapshot['roots'])
+        self.failed = dict(snapshot.get('failed', {}))
+        # Версии не копируются в сборщик: для двоичного снимка это заняло бы время, пропорциональное графу
+        self.snapshot_versions = snapshot.get('versions', {})
+        if 'cycles' in snapshot:
+            self.cycles = snapshot['cycles']
+            self.components = snapshot['components']
+        else:
+            self.detect_cycles()
+        return snapshot
+
+def build_graph_from_config(graph_builder: DependencyGraph, config: Dict,
+                            roots: List[str], metrics: Metrics = None) -> Dict[str, List[str]]:
+    """Построение графа по конфигурации: полный обход или инкрементальное обновление снимка"""
+    for _ in iter_graph_from_config(graph_builder, config, roots, metrics):
+        pass
+    return graph_builder.graph
 
-def build_graph_stage(config: Dict, collector, dependencies: List[str]) -> DependencyGraph:
-    """Этап 3: Построение графа зависимостей"""
-    graph_builder = DependencyGraph(collector)
+def iter_graph_from_config(graph_builder: DependencyGraph, config: Dict, roots: List[str],
+                           metrics: Metrics = None) -> Iterator[Tuple[str, List[str]]]:
+    """Потоковый вариант build_graph_from_config: пакеты с зависимостями выдаются по мере обхода.
     
-    print("\nПостроение графа зависимостей")
+    При инкрементальном обновлении граф выдается целиком после обновления снимка.
+    """
+    max_depth = config.get('max_depth')
+    max_workers = config.get('max_workers', 1)
+    snapshot_file = config.get('snapshot_file')
+    collector = graph_builder.collector
     
-    # Построение графа с помощью DFS
-    dependency_graph = graph_builder.build_graph_dfs(config['package_name'])
+    # Серийный номер фиксируется до обхода, чтобы изменения во время обхода
+    # попали в следующее обновление
+    serial = collector.get_last_serial() if snapshot_file else None
     
-    print(f" Граф построен. Всего узлов: {len(dependency_graph)}")
+    snapshot = None
+    if snapshot_file and config.get('incremental', False) and os.path.exists(snapshot_file):
+        snapshot = load_snapshot(snapshot_file)
+        if snapshot['roots'] != graph_builder.root_keys(roots):
+            print(" Набор корневых пакетов изменился, выполняется полный обход")
+            snapshot = None
     
-    # Обнаружение циклических зависимостей
-    cycles = graph_builder.detect_cycles()
-    if cycles:
-        print(" Обнаружены циклические зависимости:")
-        for i, cycle in enumerate(cycles, 1):
-            print(f"  Цикл {i}: {' -> '.join(cycle)} -> {cycle[0]}")
+    start = time.perf_counter()
+    if snapshot:
+        changed = graph_builder.refresh_graph(snapshot, max_depth, max_workers)
+        print(f" Граф обновлен инкрементально. Изменившихся пакетов: {len(changed)}")
+        yield from graph_builder.graph.items()
     else:
-        print(" Циклические зависимости не обнаружены")
+        yield from graph_builder.iter_graph_multi(roots, max_depth, max_workers)
+    elapsed = time.perf_counter() - start
     
-    # Демонстрация работы с тестовым репозиторием
-    if config.get('test_mode', False):
-        print(f"\n Режим тестирования: используется файл {config['test_repo_path']}")
-        test_graph = graph_builder.build_graph_dfs(config['package_name'])
-        print(f"Тестовый граф: {test_graph}")
+    if metrics:
+        nodes = len(graph_builder.graph)
+        edges = sum(len(deps) for deps in graph_builder.graph.values())
+        metrics.gauge('graph.nodes', nodes)
+        metrics.gauge('graph.edges', edges)
+        metrics.gauge('graph.build_seconds', round(elapsed, 6))
+        if elapsed > 0:
+            metrics.gauge('graph.nodes_per_second', round(nodes / elapsed, 1))
+            metrics.gauge('graph.edges_per_second', round(edges / elapsed, 1))
     
-    return graph_builder
\ No newline at end of file
+    if snapshot_file:
+        save_snapshot(snapshot_file, graph_builder.graph, graph_builder.roots, graph_builder.package_versions(),
+                      serial, binary=config.get('snapshot_format', 'json') == 'binary', failed=graph_builder.failed)
+
+def print_cycles(graph_builder: DependencyGraph):
+    """Вывод циклов, найденных detect_cycles, с размерами их компонент"""
+    if not graph_builder.cycles:
+        print(" Циклические зависимости не обнаружены")
+        return
+    print(" Обнаружены циклические зависимости:")
+    for i, (cycle, component) in enumerate(zip(graph_builder.cycles, graph_builder.components), 1):
+        print(f"  Цикл {i}: {' -> '.join(cycle)} -> {cycle[0]}")
+        if len(component) > len(cycle):
+            print(f"    Всего пакетов в компоненте: {len(component)}")
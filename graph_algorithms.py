@@ -0,0 +1,46 @@
+from typing import Dict, List, Tuple, Union
+from compact_graph import AdjacencyView, CompactGraph
+
+GraphLike = Union[Dict[str, List[str]], CompactGraph]
+
+
+def as_compact(graph: GraphLike, unique_rows: bool = False) -> CompactGraph:
+    """Приведение графа к компактному представлению (без копирования, если оно уже есть)"""
+    if isinstance(graph, CompactGraph):
+        return graph
+    if isinstance(graph, AdjacencyView) and not graph.reverse:
+        return graph.compact
+    return CompactGraph.from_dict(graph, unique_rows)
+
+
+def strongly_connected_components(graph: GraphLike) -> List[List[str]]:
+    """Поиск компонент сильной связности итеративным алгоритмом Тарьяна за O(V + E).
+
+    Компоненты возвращаются в обратном топологическом порядке: компонента
+    идет раньше всех компонент, которые от нее зависят.
+    Учитываются только узлы, присутствующие в графе как ключи.
+    """
+    compact = as_compact(graph)
+    names = compact.names
+    return [
+        [names[node] for node in component]
+        for component in compact.strongly_connected_components()
+        if compact.has_row[component[0]]
+    ]
+
+
+def cyclic_components(graph: GraphLike) -> List[Tuple[List[str], List[str]]]:
+    """Циклические компоненты сильной связности и представительный цикл каждой из них"""
+    compact = as_compact(graph)
+    names = compact.names
+    result = []
+    for component in compact.strongly_connected_components():
+        if compact.is_cyclic(component):
+            cycle = compact.shortest_cycle(component)
+            result.append(([names[node] for node in component], [names[node] for node in cycle]))
+    return result
+
+
+def find_cycles(graph: GraphLike) -> List[List[str]]:
+    """Представительный цикл для каждой циклической компоненты сильной связности"""
+    return [cycle for _, cycle in cyclic_components(graph)]
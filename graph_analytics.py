@@ -0,0 +1,279 @@
+import json
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+from compact_graph import CompactGraph
+from graph_algorithms import as_compact
+from metrics import Metrics
+from reachability import popcount
+
+# Состояние процесса-исполнителя: сжатый DAG передается один раз при запуске пула
+_worker_dag = None
+
+
+class CondensedDag:
+    """DAG компонент сильной связности в CSR-массивах.
+
+    Компоненты пронумерованы в порядке Тарьяна (зависимости раньше зависимых),
+    а узлы перенумерованы так, что узлы компоненты c занимают позиции
+    [start[c], start[c + 1]). Поэтому все транзитивные зависимости компоненты
+    лежат левее ее позиций, а все зависимые - правее.
+    """
+
+    def __init__(self, compact: CompactGraph):
+        components = compact.strongly_connected_components()
+        component_of = array('i', bytes(4 * compact.node_count))
+        start = array('q', [0])
+        for component_id, component in enumerate(components):
+            for node in component:
+                component_of[node] = component_id
+            start.append(start[-1] + len(component))
+
+        successors: List[List[int]] = [[] for _ in components]
+        for component_id, component in enumerate(components):
+            targets = set()
+            for node in component:
+                for dep in compact.successors(node):
+                    dep_component = component_of[dep]
+                    if dep_component != component_id:
+                        targets.add(dep_component)
+            successors[component_id] = sorted(targets)
+
+        self.components = components
+        self.component_of = component_of
+        self.start = start
+        self.offsets, self.targets = _to_csr(successors)
+        predecessors: List[List[int]] = [[] for _ in components]
+        for component_id, targets in enumerate(successors):
+            for dep_component in targets:
+                predecessors[dep_component].append(component_id)
+        self.reverse_offsets, self.reverse_targets = _to_csr(predecessors)
+
+    @property
+    def size(self) -> int:
+        return len(self.components)
+
+    def arrays(self) -> Tuple[array, array, array, array, array]:
+        """Массивы, достаточные для подсчета по блокам (передаются в процессы)"""
+        return self.offsets, self.targets, self.reverse_offsets, self.reverse_targets, self.start
+
+
+def _to_csr(rows: List[List[int]]) -> Tuple[array, array]:
+    offsets = array('q', [0])
+    targets = array('i')
+    for row in rows:
+        targets.extend(row)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _init_worker(dag_arrays):
+    global _worker_dag
+    _worker_dag = dag_arrays
+
+
+def _count_block_worker(task: Tuple[bool, int, int]) -> array:
+    return count_block(_worker_dag, *task)
+
+
+def count_block(dag_arrays, descendants: bool, low: int, high: int) -> array:
+    """Число транзитивных зависимостей (или зависимых) каждой компоненты среди узлов
+    с позициями [low, high).
+
+    Множества узлов блока - целые числа Python как битовые строки: объединение
+    множеств по ребру - одна операция OR над машинными словами. Множество
+    компоненты освобождается, как только обработаны все ее потребители.
+    """
+    offsets, targets, reverse_offsets, reverse_targets, start = dag_arrays
+    count = len(start) - 1
+    counts = array('q', bytes(8 * count))
+    bits = [0] * count
+    if descendants:
+        # Зависимости компоненты лежат левее ее позиций: компоненты левее блока пропускаются
+        order = range(count)
+        edge_offsets, edge_targets = offsets, targets
+        users = [reverse_offsets[c + 1] - reverse_offsets[c] for c in range(count)]
+        skip = lambda c: start[c] <= low
+    else:
+        order = range(count - 1, -1, -1)
+        edge_offsets, edge_targets = reverse_offsets, reverse_targets
+        users = [offsets[c + 1] - offsets[c] for c in range(count)]
+        skip = lambda c: start[c + 1] >= high
+
+    for c in order:
+        if skip(c):
+            continue
+        value = 0
+        for k in range(edge_offsets[c], edge_offsets[c + 1]):
+            other = edge_targets[k]
+            value |= bits[other]
+            # Собственные узлы соседней компоненты, попадающие в блок
+            first, last = max(start[other], low), min(start[other + 1], high)
+            if first < last:
+                value |= ((1 << (last - first)) - 1) << (first - low)
+            users[other] -= 1
+            if not users[other]:
+                bits[other] = 0
+        if value:
+            counts[c] = popcount(value)
+            if users[c]:
+                bits[c] = value
+    return counts
+
+
+class GraphAnalytics:
+    """Пакетная аналитика «веса» зависимостей для всех пакетов графа сразу.
+
+    Для каждого пакета вычисляются число транзитивных зависимостей и зависимых,
+    высота (длина самой длинной цепочки зависимостей под пакетом) и глубина
+    (длина самой длинной цепочки зависимых над ним). Циклическая компонента
+    считается одним звеном цепочки. Подсчет идет блоками по block_size позиций,
+    что ограничивает память, и при workers > 1 распределяется по процессам.
+    """
+
+    def __init__(self, graph: Union[Dict[str, List[str]], CompactGraph],
+                 block_size: int = 1 << 14, workers: int = 1):
+        self.compact = as_compact(graph)
+        self.block_size = block_size
+        self.workers = workers
+        self.dag = CondensedDag(self.compact)
+        count = self.dag.size
+        self.dependency_counts = array('q', bytes(8 * count))
+        self.dependent_counts = array('q', bytes(8 * count))
+        self.height = array('i', bytes(4 * count))
+        self.depth = array('i', bytes(4 * count))
+        # Следующая компонента на самой длинной цепочке зависимостей (-1 для листьев)
+        self.next_on_chain = array('i', [-1] * count)
+
+    def compute(self) -> 'GraphAnalytics':
+        self._compute_chains()
+        self._compute_counts()
+        return self
+
+    def _compute_chains(self):
+        """Высота и глубина по DAG компонент за O(C + E)"""
+        dag = self.dag
+        for c in range(dag.size):
+            for k in range(dag.offsets[c], dag.offsets[c + 1]):
+                dep = dag.targets[k]
+                if self.height[dep] + 1 > self.height[c]:
+                    self.height[c] = self.height[dep] + 1
+                    self.next_on_chain[c] = dep
+        for c in range(dag.size - 1, -1, -1):
+            for k in range(dag.reverse_offsets[c], dag.reverse_offsets[c + 1]):
+                user = dag.reverse_targets[k]
+                self.depth[c] = max(self.depth[c], self.depth[user] + 1)
+
+    def _compute_counts(self):
+        total = self.dag.start[-1]
+        tasks = [(descendants, low, min(low + self.block_size, total))
+                 for descendants in (True, False)
+                 for low in range(0, total, self.block_size)]
+        dag_arrays = self.dag.arrays()
+        if self.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(dag_arrays,)) as executor:
+                results = list(executor.map(_count_block_worker, tasks))
+        else:
+            results = [count_block(dag_arrays, *task) for task in tasks]
+
+        for (descendants, _, _), counts in zip(tasks, results):
+            target = self.dependency_counts if descendants else self.dependent_counts
+            for c, value in enumerate(counts):
+                if value:
+                    target[c] += value
+
+        # Остальные пакеты своей циклической компоненты тоже транзитивно связаны с пакетом
+        for c, component in enumerate(self.dag.components):
+            if len(component) > 1:
+                self.dependency_counts[c] += len(component) - 1
+                self.dependent_counts[c] += len(component) - 1
+
+    def metrics_of(self, package: str) -> Optional[Dict[str, int]]:
+        """Показатели одного пакета (None, если пакета нет в графе)"""
+        node = self.compact.id_of(package)
+        if node is None:
+            return None
+        c = self.dag.component_of[node]
+        return {
+            'dependencies': self.dependency_counts[c],
+            'dependents': self.dependent_counts[c],
+            'height': self.height[c],
+            'depth': self.depth[c]
+        }
+
+    def top(self, metric: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Пакеты с наибольшим значением показателя"""
+        values = {
+            'dependencies': self.dependency_counts, 'dependents': self.dependent_counts,
+            'height': self.height, 'depth': self.depth
+        }[metric]
+        names = self.compact.names
+        ranking = [(names[node], values[c])
+                   for c, component in enumerate(self.dag.components) for node in component]
+        ranking.sort(key=lambda item: item[1], reverse=True)
+        return ranking[:limit]
+
+    def critical_chain(self, package: str = None) -> List[str]:
+        """Самая длинная цепочка зависимостей от пакета (по умолчанию - во всем графе).
+
+        Для пакета, которого нет в графе, возвращается пустой список.
+        """
+        if package is None:
+            if not self.dag.size:
+                return []
+            c = max(range(self.dag.size), key=self.height.__getitem__)
+        else:
+            node = self.compact.id_of(package)
+            if node is None:
+                return []
+            c = self.dag.component_of[node]
+        names = self.compact.names
+        chain = []
+        while c != -1:
+            component = self.dag.components[c]
+            name = names[component[0]]
+            chain.append(name if len(component) == 1 else f"{name} +{len(component) - 1} (цикл)")
+            c = self.next_on_chain[c]
+        return chain
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        names = self.compact.names
+        return {
+            names[node]: {
+                'dependencies': self.dependency_counts[c],
+                'dependents': self.dependent_counts[c],
+                'height': self.height[c],
+                'depth': self.depth[c]
+            }
+            for c, component in enumerate(self.dag.components) for node in component
+        }
+
+
+def graph_analytics_stage(graph: Union[Dict[str, List[str]], CompactGraph], config: Dict,
+                          metrics: Metrics = None) -> GraphAnalytics:
+    """Пакетная аналитика веса зависимостей для всего графа"""
+    print("\nАналитика зависимостей")
+    analytics = GraphAnalytics(
+        graph,
+        block_size=config.get('analytics_block_size', 1 << 14),
+        workers=config.get('analytics_workers', 1)
+    ).compute()
+    if metrics:
+        metrics.gauge('analytics.components', analytics.dag.size)
+
+    print(" Больше всего транзитивных зависимостей:")
+    for package, count in analytics.top('dependencies', 5):
+        print(f"  - {package}: {count}")
+    print(" Больше всего транзитивно зависимых пакетов:")
+    for package, count in analytics.top('dependents', 5):
+        print(f"  - {package}: {count}")
+    chain = analytics.critical_chain()
+    print(f" Самая длинная цепочка зависимостей ({max(len(chain) - 1, 0)} ребер): {' -> '.join(chain)}")
+
+    if config.get('analytics_report'):
+        with open(config['analytics_report'], 'w', encoding='utf-8') as f:
+            json.dump({'packages': analytics.to_dict(), 'critical_chain': chain},
+                      f, ensure_ascii=False, indent=2)
+        print(f" Отчет аналитики сохранен в: {config['analytics_report']}")
+    return analytics
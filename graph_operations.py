@@ -1,52 +1,104 @@
-from typing import List, Dict, Set
-from collections import deque, defaultdict
+import threading
+from typing import List, Dict, Tuple, Union
+from collections.abc import Mapping
+from compact_graph import CompactGraph
+from graph_algorithms import as_compact
+from graph_analytics import GraphAnalytics
+from reachability import ReachabilityIndex
 
 class GraphOperations:
-    def __init__(self, graph: Dict[str, List[str]]):
-        self.graph = graph
-        self.reverse_graph = self._build_reverse_graph()
+    def __init__(self, graph: Union[Dict[str, List[str]], CompactGraph], reverse_graph: Mapping = None,
+                 reachability_index: bool = False):
+        # Операции выполняются над компактным целочисленным представлением,
+        # словарные graph и reverse_graph остаются доступны как представления
+        self.compact = as_compact(graph)
+        self.graph = graph if not isinstance(graph, CompactGraph) else self.compact.forward_view()
+        # Обратный индекс, уже собранный при обходе, не строится повторно
+        self.reverse_graph = reverse_graph if reverse_graph is not None else self._build_reverse_graph()
+        self._load_order_cache: Dict[str, List[str]] = {}
+        # Битовый индекс достижимости занимает O(C * V / 8) байт и строится только по запросу
+        self.use_reachability_index = reachability_index
+        self._reachability: ReachabilityIndex = None
+        self._analytics: GraphAnalytics = None
+        self._lazy_lock = threading.Lock()
     
-    def _build_reverse_graph(self) -> Dict[str, List[str]]:
+    def _build_reverse_graph(self) -> Mapping:
         """Построение обратного графа для поиска обратных зависимостей"""
-        reverse = defaultdict(list)
-        for package, dependencies in self.graph.items():
-            for dep in dependencies:
-                reverse[dep].append(package)
-        return dict(reverse)
+        return self.compact.reverse_view()
     
     def get_load_order(self, package: str) -> List[str]:
         """Получение порядка загрузки зависимостей (топологическая сортировка)"""
-        in_degree = defaultdict(int)
-        
-        # Вычисляем входящие степени
-        for node in self.graph:
-            for neighbor in self.graph.get(node, []):
-                in_degree[neighbor] += 1
-            if node not in in_degree:
-                in_degree[node] = 0
-        
-        # Алгоритм Кана для топологической сортировки
-        queue = deque([node for node in in_degree if in_degree[node] == 0])
-        load_order = []
-        
-        while queue:
-            current = queue.popleft()
-            load_order.append(current)
-            
-            for neighbor in self.graph.get(current, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
-        
-        if len(load_order) != len(in_degree):
-            print(" В графе есть циклы, полная топологическая сортировка невозможна")
-        
-        return load_order
+        if package not in self._load_order_cache:
+            root = self.compact.id_of(package)
+            if root is None:
+                self._load_order_cache[package] = [package]
+            else:
+                # Сортируются только пакеты, достижимые из запрошенного; циклы сводятся
+                # в компоненты сильной связности, поэтому позицию получает каждый пакет
+                components = self.compact.strongly_connected_components([root])
+                names = self.compact.names
+                self._load_order_cache[package] = [
+                    names[node] for component in reversed(components) for node in component
+                ]
+        return list(self._load_order_cache[package])
     
     def get_reverse_dependencies(self, package: str) -> List[str]:
         """Получение обратных зависимостей (какие пакеты зависят от данного)"""
         return self.reverse_graph.get(package, [])
     
+    @property
+    def reachability(self) -> ReachabilityIndex:
+        """Индекс транзитивных обратных зависимостей (строится при первом запросе, один раз)"""
+        with self._lazy_lock:
+            if self._reachability is None:
+                self._reachability = ReachabilityIndex(self.compact)
+        return self._reachability
+    
+    @property
+    def analytics(self) -> GraphAnalytics:
+        """Блочный подсчет транзитивных зависимых без множеств пакетов (память O(V + E))"""
+        with self._lazy_lock:
+            if self._analytics is None:
+                self._analytics = GraphAnalytics(self.compact).compute()
+        return self._analytics
+    
+    def get_transitive_reverse_dependencies(self, package: str) -> List[str]:
+        """Все пакеты, которые затронет плохой релиз данного пакета.
+        
+        С reachability_index ответ берется из битового индекса, иначе - обходом
+        обратных ребер от пакета (время пропорционально размеру ответа).
+        """
+        if self.use_reachability_index:
+            return self.reachability.get_transitive_dependents(package)
+        start = self.compact.id_of(package)
+        if start is None:
+            return []
+        offsets = self.compact.reverse_offsets
+        targets = self.compact.reverse_targets
+        seen = bytearray(self.compact.node_count)
+        seen[start] = 1
+        found = []
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for k in range(offsets[node], offsets[node + 1]):
+                predecessor = targets[k]
+                if not seen[predecessor]:
+                    seen[predecessor] = 1
+                    found.append(predecessor)
+                    stack.append(predecessor)
+        names = self.compact.names
+        return [names[node] for node in sorted(found)]
+    
+    def count_transitive_reverse_dependencies(self, package: str) -> int:
+        """Число пакетов, которые затронет плохой релиз данного пакета"""
+        metrics = self.analytics.metrics_of(package)
+        return metrics['dependents'] if metrics is not None else 0
+    
+    def rank_by_blast_radius(self, limit: int = None) -> List[Tuple[str, int]]:
+        """Ранжирование пакетов по числу транзитивно зависящих от них пакетов"""
+        return self.analytics.top('dependents', limit)
+    
     def compare_with_actual_manager(self, package: str):
         """Сравнение с реальным менеджером пакетов"""
         our_order = self.get_load_order(package)
@@ -63,9 +115,10 @@ class GraphOperations:
         print("\n Примечание: для точного сравнения с pip можно использовать:")
         print("   pip show <package> или pipdeptree")
 
-def additional_operations_stage(graph: Dict[str, List[str]], config: Dict):
+def additional_operations_stage(graph: Union[Dict[str, List[str]], CompactGraph], config: Dict,
+                                reverse_graph: Mapping = None):
     """Этап 4: Дополнительные операции над графом"""
-    operations = GraphOperations(graph)
+    operations = GraphOperations(graph, reverse_graph, config.get('reachability_index', False))
     
     print("\nДополнительные операции")
     
@@ -87,4 +140,9 @@ def additional_operations_stage(graph: Dict[str, List[str]], config: Dict):
     else:
         print(f"\n Нет пакетов, зависящих от '{config['package_name']}'")
     
+    # Пакеты с наибольшим числом транзитивно зависящих от них пакетов
+    print("\n Пакеты с наибольшим радиусом поражения:")
+    for package, count in operations.rank_by_blast_radius(5):
+        print(f"  - {package}: {count}")
+    
     return operations
\ No newline at end of file
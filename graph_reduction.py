@@ -0,0 +1,124 @@
+from collections import deque
+from typing import Dict, List, Tuple
+from compact_graph import CompactGraph
+
+
+def cut_by_depth(graph: Dict[str, List[str]], root: str, max_depth: int) -> Dict[str, List[str]]:
+    """Оставляет только пакеты не глубже max_depth от корня"""
+    depths = {root: 0}
+    queue = deque([root])
+    while queue:
+        package = queue.popleft()
+        if depths[package] >= max_depth:
+            continue
+        for dep in graph.get(package, []):
+            if dep not in depths:
+                depths[dep] = depths[package] + 1
+                queue.append(dep)
+
+    return {
+        package: [dep for dep in graph.get(package, []) if dep in depths] if depths[package] < max_depth else []
+        for package in depths
+    }
+
+
+def collapse_cycles(graph: Dict[str, List[str]], root: str,
+                    compact: CompactGraph = None) -> Tuple[Dict[str, List[str]], str]:
+    """Сворачивание каждой циклической компоненты в один узел; compact - уже построенное представление graph"""
+    if compact is None:
+        compact = CompactGraph.from_dict(graph)
+    names = compact.names
+    label_of = {}
+    for component in compact.strongly_connected_components():
+        if len(component) > 1:
+            label = f"{names[component[0]]} +{len(component) - 1} (цикл)"
+            for node in component:
+                label_of[names[node]] = label
+
+    collapsed: Dict[str, List[str]] = {}
+    for package, dependencies in graph.items():
+        source = label_of.get(package, package)
+        targets = collapsed.setdefault(source, [])
+        for dep in dependencies:
+            target = label_of.get(dep, dep)
+            if target != source and target not in targets:
+                targets.append(target)
+    return collapsed, label_of.get(root, root)
+
+
+def transitive_reduction(graph: Dict[str, List[str]], compact: CompactGraph = None) -> Dict[str, List[str]]:
+    """Удаление ребер, которые следуют из других путей (ребра внутри циклов сохраняются)"""
+    if compact is None:
+        compact = CompactGraph.from_dict(graph)
+    components = compact.strongly_connected_components()
+    component_of = {}
+    for component_id, component in enumerate(components):
+        for node in component:
+            component_of[node] = component_id
+
+    # Тарьян выдает компоненты от зависимостей к зависимым, поэтому множества
+    # достижимых компонент потомков уже посчитаны к моменту обработки предка
+    reach = [0] * len(components)
+    redundant = [0] * len(components)
+    for component_id, component in enumerate(components):
+        bits = 0
+        covered = 0
+        for node in component:
+            for neighbor in compact.successors(node):
+                neighbor_component = component_of[neighbor]
+                if neighbor_component != component_id:
+                    bits |= (1 << neighbor_component) | reach[neighbor_component]
+                    covered |= reach[neighbor_component]
+        reach[component_id] = bits
+        redundant[component_id] = covered
+
+    reduced = {}
+    for package, dependencies in graph.items():
+        node = compact.id_of(package)
+        source_component = component_of[node]
+        reduced[package] = [
+            dep for dep in dict.fromkeys(dependencies)
+            if component_of[compact.id_of(dep)] == source_component
+            or not redundant[source_component] >> component_of[compact.id_of(dep)] & 1
+        ]
+    return reduced
+
+
+def summarize_leaves(graph: Dict[str, List[str]], threshold: int) -> Dict[str, List[str]]:
+    """Замена больших групп листовых зависимостей одним сводным узлом"""
+    summarized = {}
+    for package, dependencies in graph.items():
+        leaves = [dep for dep in dependencies if not graph.get(dep)]
+        if len(leaves) > threshold:
+            leaf_set = set(leaves)
+            summary = f"{package}: {len(leaves)} листовых пакетов"
+            summarized[package] = [dep for dep in dependencies if dep not in leaf_set] + [summary]
+        else:
+            summarized[package] = list(dependencies)
+
+    # Листовые пакеты, на которые больше никто не ссылается, удаляются
+    referenced = {dep for dependencies in summarized.values() for dep in dependencies}
+    return {
+        package: dependencies for package, dependencies in summarized.items()
+        if dependencies or package in referenced
+    }
+
+
+def reduce_graph(graph: Dict[str, List[str]], root: str, options: Dict,
+                 compact: CompactGraph = None) -> Tuple[Dict[str, List[str]], str]:
+    """Упрощение графа для визуализации согласно параметрам d2_reduce.
+
+    compact - представление исходного графа; его использует первый проход,
+    следующие работают с уже измененным графом.
+    """
+    if options.get('max_depth'):
+        graph = cut_by_depth(graph, root, options['max_depth'])
+        compact = None
+    if options.get('collapse_cycles', False):
+        graph, root = collapse_cycles(graph, root, compact)
+        compact = None
+    if options.get('transitive_reduction', False):
+        graph = transitive_reduction(graph, compact)
+    if options.get('summarize_leaves'):
+        graph = summarize_leaves(graph, options['summarize_leaves'])
+    return graph, root
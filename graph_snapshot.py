@@ -0,0 +1,338 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, List, Optional, Tuple
+from compact_graph import CompactGraph
+
+SNAPSHOT_FORMAT = 1
+
+# Двоичный снимок: заголовок, таблица секций и секции, выровненные по 8 байт
+BINARY_MAGIC = b'DVGRAPH\x00'
+BINARY_FORMAT = 2
+_SECTIONS = ('string_offsets', 'string_data', 'has_row', 'offsets', 'targets',
+             'reverse_offsets', 'reverse_targets', 'component_of',
+             'cyclic_offsets', 'cyclic_members', 'version_offsets', 'version_data', 'metadata')
+_SECTION_TYPES = {
+    'string_offsets': 'q', 'string_data': 'B', 'has_row': 'B', 'offsets': 'q', 'targets': 'i',
+    'reverse_offsets': 'q', 'reverse_targets': 'i', 'component_of': 'i',
+    'cyclic_offsets': 'q', 'cyclic_members': 'i', 'version_offsets': 'q', 'version_data': 'B',
+    'metadata': 'B'
+}
+# magic, формат, число узлов, число ребер, затем (смещение, длина) каждой секции
+_HEADER = struct.Struct('<8sIxxxxqq' + 'qq' * len(_SECTIONS))
+
+
+def save_snapshot(file_path: str, graph: Dict[str, List[str]], roots: List[str],
+                  versions: Dict[str, str] = None, serial: Optional[int] = None,
+                  binary: bool = False, failed: Dict[str, int] = None):
+    """Сохранение снимка графа для последующего инкрементального обновления"""
+    if binary:
+        save_binary_snapshot(file_path, graph, roots, versions, serial, failed)
+        return
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'created_at': time.time(),
+        'roots': roots,
+        'serial': serial,
+        'versions': versions or {},
+        'failed': failed or {},
+        'graph': graph
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_snapshot(file_path: str) -> Dict:
+    """Загрузка снимка графа; формат (JSON или двоичный) определяется по первым байтам"""
+    try:
+        with open(file_path, 'rb') as f:
+            is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+        if is_binary:
+            return MappedSnapshot(file_path).to_snapshot()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        raise Exception(f"Ошибка чтения снимка графа {file_path}: {e}")
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise Exception(f"Неподдерживаемый формат снимка графа: {snapshot.get('format')}")
+    return snapshot
+
+
+def save_binary_snapshot(file_path: str, graph: Dict[str, List[str]], roots: List[str],
+                         versions: Dict[str, str] = None, serial: Optional[int] = None,
+                         failed: Dict[str, int] = None):
+    """Сохранение графа в двоичном формате для загрузки через mmap.
+
+    Имена пакетов упорядочены, поэтому поиск узла по имени - двоичный поиск
+    по таблице строк без построения словаря. Хранятся прямые и обратные
+    CSR-массивы, номер компоненты сильной связности каждого узла, циклы и
+    версии пакетов - таблицей строк по номеру узла (пустая строка - версии нет).
+    В JSON-секции metadata остаются только данные, не растущие с размером графа.
+    """
+    source = CompactGraph.from_dict(graph)
+    order = sorted(range(source.node_count), key=source.names.__getitem__)
+    new_id = array('i', bytes(4 * len(order)))
+    for i, node in enumerate(order):
+        new_id[node] = i
+
+    names = [source.names[node] for node in order]
+    offsets = array('q', [0])
+    targets = array('i')
+    has_row = bytearray(len(order))
+    for i, node in enumerate(order):
+        # Порядок зависимостей внутри строки сохраняется
+        targets.extend(new_id[dep] for dep in source.successors(node))
+        offsets.append(len(targets))
+        has_row[i] = source.has_row[node]
+    compact = CompactGraph(names, offsets, targets, has_row)
+
+    component_of = array('i', bytes(4 * len(names)))
+    # Узлы циклических компонент подряд, по одной строке CSR на компоненту
+    cyclic_offsets = array('q', [0])
+    cyclic_members = array('i')
+    cycles = []
+    for component_id, component in enumerate(compact.strongly_connected_components()):
+        for node in component:
+            component_of[node] = component_id
+        if compact.is_cyclic(component):
+            cyclic_members.extend(component)
+            cyclic_offsets.append(len(cyclic_members))
+            cycles.append([names[node] for node in compact.shortest_cycle(component)])
+
+    string_data, string_offsets = _string_table(names)
+    versions = versions or {}
+    version_data, version_offsets = _string_table(versions.get(name) or '' for name in names)
+
+    metadata = {
+        'created_at': time.time(),
+        'roots': roots,
+        'serial': serial,
+        'failed': failed or {},
+        'cycles': cycles
+    }
+    sections = {
+        'string_offsets': string_offsets.tobytes(),
+        'string_data': bytes(string_data),
+        'has_row': bytes(has_row),
+        'offsets': offsets.tobytes(),
+        'targets': targets.tobytes(),
+        'reverse_offsets': compact.reverse_offsets.tobytes(),
+        'reverse_targets': compact.reverse_targets.tobytes(),
+        'component_of': component_of.tobytes(),
+        'cyclic_offsets': cyclic_offsets.tobytes(),
+        'cyclic_members': cyclic_members.tobytes(),
+        'version_offsets': version_offsets.tobytes(),
+        'version_data': bytes(version_data),
+        'metadata': json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    }
+
+    layout = []
+    position = _HEADER.size
+    for name in _SECTIONS:
+        position = (position + 7) & ~7
+        layout.extend((position, len(sections[name])))
+        position += len(sections[name])
+
+    # Новый файл подменяет старый целиком: процессы, отобразившие старый снимок, его не увидят
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT, len(names), len(targets), *layout))
+        for name, section_offset in zip(_SECTIONS, layout[::2]):
+            f.write(b'\x00' * (section_offset - f.tell()))
+            f.write(sections[name])
+    os.replace(temp_path, file_path)
+
+
+def _string_table(strings) -> Tuple[bytearray, array]:
+    """Строки подряд в UTF-8 и смещения их границ"""
+    data = bytearray()
+    offsets = array('q', [0])
+    for string in strings:
+        data += string.encode('utf-8')
+        offsets.append(len(data))
+    return data, offsets
+
+
+class StringTable(Sequence):
+    """Упорядоченная таблица имен в отображенном файле: имя по номеру и номер по имени"""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        offsets, data = self._offsets, self._data
+        for i in range(len(self)):
+            yield str(data[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    def __contains__(self, name) -> bool:
+        return self.get(name) is not None
+
+    def get(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        """Номер имени двоичным поиском (порядок байт UTF-8 совпадает с порядком строк)"""
+        key = name.encode('utf-8')
+        offsets, data = self._offsets, self._data
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            value = bytes(data[offsets[middle]:offsets[middle + 1]])
+            if value < key:
+                low = middle + 1
+            elif value > key:
+                high = middle
+            else:
+                return middle
+        return default
+
+
+class NodeGroups(Sequence):
+    """Группы узлов в CSR-массивах (например, циклические компоненты) как списки имен"""
+
+    def __init__(self, offsets: memoryview, members: memoryview, names: StringTable):
+        self._offsets = offsets
+        self._members = members
+        self._names = names
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> List[str]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        names = self._names
+        return [names[node] for node in self._members[self._offsets[index]:self._offsets[index + 1]]]
+
+
+class VersionTable(Mapping):
+    """Версии пакетов из отображенного снимка: {пакет: версия} без разбора всех записей"""
+
+    def __init__(self, names: StringTable, versions: StringTable):
+        self._names = names
+        self._versions = versions
+
+    def __getitem__(self, package: str) -> str:
+        node_id = self._names.get(package)
+        version = self._versions[node_id] if node_id is not None else ''
+        if not version:
+            raise KeyError(package)
+        return version
+
+    def __iter__(self):
+        for name, version in zip(self._names, self._versions):
+            if version:
+                yield name
+
+    def __len__(self) -> int:
+        offsets = self._versions._offsets
+        return sum(1 for i in range(len(self._versions)) if offsets[i] != offsets[i + 1])
+
+
+class MappedSnapshot:
+    """Двоичный снимок графа, отображенный в память.
+
+    Массивы читаются прямо из страниц файла без копирования и разбора, поэтому
+    загрузка занимает миллисекунды независимо от размера графа, а несколько
+    процессов, открывших один снимок, разделяют одни и те же страницы.
+    """
+
+    def __init__(self, file_path: str):
+        if sys.byteorder != 'little':
+            raise Exception("Двоичный снимок графа поддерживается только на little-endian платформах")
+        self.path = file_path
+        self._file = open(file_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise Exception(f"Пустой файл снимка графа: {file_path}")
+        self._view = memoryview(self._mmap)
+        if len(self._view) < _HEADER.size:
+            self.close()
+            raise Exception(f"Поврежденный снимок графа: {file_path}")
+        magic, version, self.node_count, self.edge_count, *layout = _HEADER.unpack_from(self._view)
+        if magic != BINARY_MAGIC or version != BINARY_FORMAT:
+            self.close()
+            raise Exception(f"Неподдерживаемый формат снимка графа: {version}")
+
+        self._sections: Dict[str, memoryview] = {}
+        for name, section_offset, length in zip(_SECTIONS, layout[::2], layout[1::2]):
+            if section_offset + length > len(self._view):
+                self.close()
+                raise Exception(f"Поврежденный снимок графа: {file_path}")
+            section = self._view[section_offset:section_offset + length]
+            self._sections[name] = section if _SECTION_TYPES[name] == 'B' else section.cast(_SECTION_TYPES[name])
+
+        # Метаданные малы: версии и другие данные по узлам хранятся в отдельных секциях
+        self.metadata = json.loads(str(self._sections['metadata'], 'utf-8'))
+        self.names = StringTable(self._sections['string_offsets'], self._sections['string_data'])
+        self.versions = VersionTable(
+            self.names, StringTable(self._sections['version_offsets'], self._sections['version_data'])
+        )
+        self.compact = CompactGraph(
+            self.names, self._sections['offsets'], self._sections['targets'], self._sections['has_row'],
+            ids=self.names, reverse=(self._sections['reverse_offsets'], self._sections['reverse_targets'])
+        )
+        self.components = NodeGroups(self._sections['cyclic_offsets'], self._sections['cyclic_members'],
+                                     self.names)
+
+    def component_of(self, package: str) -> Optional[int]:
+        """Номер компоненты сильной связности пакета"""
+        node_id = self.names.get(package)
+        return None if node_id is None else self._sections['component_of'][node_id]
+
+    def to_snapshot(self) -> Dict:
+        """Снимок в виде словаря, как у load_snapshot для JSON; граф - представление над mmap"""
+        return {
+            'format': BINARY_FORMAT,
+            'created_at': self.metadata['created_at'],
+            'roots': self.metadata['roots'],
+            'serial': self.metadata['serial'],
+            'versions': self.versions,
+            'failed': self.metadata['failed'],
+            'cycles': self.metadata['cycles'],
+            'components': self.components,
+            'graph': self.compact.forward_view(),
+            'mapped': self
+        }
+
+    def close(self):
+        """Освобождение отображения; после него граф и таблица имен снимка недоступны.
+
+        Срезы массивов, полученные ранее (successors, predecessors), остаются
+        действительными: отображение освобождается, когда удален последний из них.
+        Повторный вызов ничего не делает.
+        """
+        for section in self._sections.values() if hasattr(self, '_sections') else ():
+            section.release()
+        self._view.release()
+        self._file.close()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # На отображение еще ссылаются срезы: оно будет закрыто вместе с ними
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
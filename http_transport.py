@@ -0,0 +1,210 @@
+import random
+import threading
+import time
+import xmlrpc.client
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Metrics
+
+# Статусы, при которых запрос повторяется: перегрузка или временный сбой сервера
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов: rate токенов в секунду, не более burst подряд"""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(int(rate), 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """Адаптивный предел одновременных запросов (AIMD).
+
+    Каждый успешный ответ увеличивает предел примерно на единицу за «раунд»
+    из limit запросов, ответ 429/5xx или ошибка соединения уменьшают его вдвое.
+    Уменьшение применяется не чаще раза в cooldown секунд, чтобы пачка
+    одновременных отказов не обрушила предел до минимума.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = None, cooldown: float = 1.0):
+        self.minimum = max(minimum, 1)
+        self.maximum = maximum or initial
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, healthy: bool):
+        with self._condition:
+            self.in_flight -= 1
+            if healthy:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+class HttpTransport:
+    """HTTP-транспорт сборщика: пул соединений, таймауты, повторы с экспоненциальной
+    задержкой и случайным разбросом, ограничение частоты и адаптивный параллелизм.
+    """
+
+    def __init__(self, pool_size: int = 32, timeout: Union[float, Tuple[float, float]] = (5, 30),
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 30,
+                 rate_limit: float = None, burst: int = None, max_concurrency: int = None,
+                 headers: Dict = None, metrics: Metrics = None):
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency or pool_size)
+
+        self.session = requests.Session()
+        # Повторы выполняются здесь, а не в urllib3, чтобы учитывать Retry-After
+        # и управлять пределом параллелизма
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url: str, headers: Dict = None) -> requests.Response:
+        """GET с повторами; последний ответ с ошибкой возвращается вызывающему"""
+        return self._request('GET', url, headers)
+
+    def post(self, url: str, data: bytes, headers: Dict = None) -> requests.Response:
+        """POST с повторами (только для идемпотентных вызовов, например чтения журнала XML-RPC)"""
+        return self._request('POST', url, headers, data)
+
+    def xmlrpc_proxy(self, url: str) -> xmlrpc.client.ServerProxy:
+        """Прокси XML-RPC, вызовы которого идут через этот транспорт"""
+        return xmlrpc.client.ServerProxy(url, transport=XmlRpcTransport(self, urlsplit(url).scheme))
+
+    def _request(self, method: str, url: str, headers: Dict = None, data: bytes = None) -> requests.Response:
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            self.concurrency.acquire()
+            healthy = False
+            try:
+                response = self.session.request(method, url, headers=headers, data=data, timeout=self.timeout)
+                healthy = response.status_code not in RETRY_STATUSES
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            finally:
+                self.concurrency.release(healthy)
+            self._gauge('http.concurrency_limit', round(self.concurrency.limit, 2))
+
+            if healthy or attempt >= self.max_retries:
+                return response
+
+            self._count('http.retries')
+            if response is not None and response.status_code == 429:
+                self._count('http.throttled')
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Задержка перед повтором: Retry-After сервера или «полный джиттер»"""
+        if response is not None:
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _count(self, name: str):
+        if self.metrics:
+            self.metrics.increment(name)
+
+    def _gauge(self, name: str, value: float):
+        if self.metrics:
+            self.metrics.gauge(name, value)
+
+
+class XmlRpcTransport(xmlrpc.client.Transport):
+    """Транспорт XML-RPC поверх HttpTransport: таймауты, повторы, пул соединений и ограничение частоты.
+
+    Стандартный транспорт xmlrpc.client не задает таймаут, и зависший сервер
+    блокировал бы обход неограниченно долго.
+    """
+
+    def __init__(self, http: HttpTransport, scheme: str = 'https'):
+        super().__init__()
+        self.http = http
+        self.scheme = scheme
+
+    def request(self, host, handler, request_body, verbose=False):
+        url = f"{self.scheme}://{host}{handler}"
+        response = self.http.post(url, request_body, headers={'Content-Type': 'text/xml'})
+        if response.status_code != 200:
+            raise xmlrpc.client.ProtocolError(url, response.status_code, response.reason, dict(response.headers))
+        parser, unmarshaller = self.getparser()
+        parser.feed(response.content)
+        parser.close()
+        return unmarshaller.close()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах (число секунд или HTTP-дата)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def create_transport(config: Dict, metrics: Metrics = None) -> HttpTransport:
+    """Создание HTTP-транспорта по параметрам конфигурации"""
+    pool_size = config.get('http_pool_size', max(config.get('max_workers', 1), 10))
+    return HttpTransport(
+        pool_size=pool_size,
+        timeout=config.get('http_timeout', (5, 30)),
+        max_retries=config.get('http_retries', 4),
+        backoff_base=config.get('http_backoff', 0.5),
+        rate_limit=config.get('rate_limit'),
+        burst=config.get('rate_limit_burst'),
+        max_concurrency=config.get('max_concurrency'),
+        headers={'User-Agent': 'DependencyVisualizer/1.0'},
+        metrics=metrics
+    )
@@ -2,6 +2,17 @@ import toml
 import argparse
 import sys
 import os
+from batch_analysis import batch_analysis_stage, collect_batch_roots
+from graph_analytics import graph_analytics_stage
+from graph_operations import additional_operations_stage
+from path_query import path_query_stage
+from pipeline import pipeline_stage
+from server import serve_stage
+from tree_renderer import LEGEND, write_dependency_tree
+from visualizer import visualization_stage
+from metadata_cache import normalize_name
+from metrics import Metrics
+from metadata_store import ingest_metadata_stage
 
 class ConfigManager:
     def __init__(self):
@@ -48,6 +59,11 @@ class ConfigManager:
         
         if not isinstance(self.config['package_name'], str) or not self.config['package_name']:
             raise Exception("Имя пакета должно быть непустой строкой")
+        
+        # Зависимости в графе хранятся под нормализованными по PEP 503 именами,
+        # корневой пакет - тоже (Sphinx и sphinx - один узел)
+        if not self.config['test_mode']:
+            self.config['package_name'] = normalize_name(self.config['package_name'])
 
 def print_config(config: dict):
     """Вывод конфигурации в формате ключ-значение"""
@@ -56,154 +72,140 @@ def print_config(config: dict):
         print(f"{key}: {value}")
     print("========================================")
 
-def mock_dependencies_stage(config: dict):
-    """Заглушка для этапа 2 - сбор данных"""
-    print("\nЭтап 2: Сбор данных")
-    
-    if config.get('test_mode', False):
-        print(" Режим тестирования: использование тестовых данных")
-        # Тестовые зависимости
-        dependencies = ['urllib3', 'certifi', 'charset-normalizer', 'idna']
-    else:
-        print(f" Получение зависимостей для {config['package_name']}...")
-        # Здесь будет реальный сбор данных
-        dependencies = ['urllib3', 'certifi', 'charset-normalizer', 'idna']
-    
-    print(f"Прямые зависимости пакета '{config['package_name']}':")
-    for i, dep in enumerate(dependencies, 1):
-        print(f"  {i}. {dep}")
-    
-    return dependencies
-
-def mock_build_graph_stage(config: dict, dependencies: list):
-    """Заглушка для этапа 3 - построение графа"""
-    print("\nЭтап 3: Построение графа")
-    
-    # Создаем тестовый граф
-    graph = {
-        config['package_name']: dependencies,
-        'urllib3': ['brotli', 'pyOpenSSL'],
-        'certifi': [],
-        'charset-normalizer': [],
-        'idna': [],
-        'brotli': [],
-        'pyOpenSSL': ['cryptography']
-    }
-    
-    print(f" Граф построен. Всего узлов: {len(graph)}")
-    print("Структура графа:")
-    for package, deps in graph.items():
-        print(f"  {package} -> {deps}")
-    
-    return graph
-
-def mock_additional_operations_stage(graph: dict, config: dict):
-    """Заглушка для этапа 4 - дополнительные операции"""
-    print("\nЭтап 4: Дополнительные операции")
-    
-    # Простой порядок загрузки
-    load_order = list(graph.keys())
-    print(f" Порядок загрузки зависимостей:")
-    for i, package in enumerate(load_order, 1):
-        print(f"  {i}. {package}")
-    
-    print("\n Сравнение с реальным менеджером пакетов:")
-    print("   Наш инструмент показывает транзитивные зависимости")
-    print("   pip показывает только прямые зависимости")
-    
-    return load_order
-
 def simple_visualization_stage(graph: dict, config: dict):
-    """Упрощенная версия этапа 5 - визуализация"""
-    print("\nЭтап 5: Визуализация графа")
-    
-    # Генерация простого текстового представления графа
-    print(" Текстовое представление графа:")
-    print("=" * 40)
-    
-    for package, dependencies in graph.items():
-        if dependencies:
-            deps_str = ", ".join(dependencies)
-            print(f"{package} -> {deps_str}")
-        else:
-            print(f"{package} (нет зависимостей)")
-    
-    print("=" * 40)
+    """Текстовое представление графа (дополняет изображение этапа 5)"""
+    # Список смежности выводится только в тестовом режиме: граф реального пакета
+    # может содержать сотни тысяч узлов, для него есть dependencies_tree.txt
+    if config.get('test_mode', False):
+        print(" Текстовое представление графа:")
+        print("=" * 40)
+        
+        for package, dependencies in graph.items():
+            if dependencies:
+                deps_str = ", ".join(dependencies)
+                print(f"{package} -> {deps_str}")
+            else:
+                print(f"{package} (нет зависимостей)")
+        
+        print("=" * 40)
     
-    # Сохраняем упрощенную визуализацию в файл
+    # Сохраняем дерево зависимостей в файл: общие поддеревья раскрываются один раз
     output_file = "dependencies_tree.txt"
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(f"Граф зависимостей для: {config['package_name']}\n")
+        f.write(f"{LEGEND}\n")
         f.write("=" * 50 + "\n")
-        for package, dependencies in graph.items():
-            if package == config['package_name']:
-                f.write(f"★ {package}\n")
-            else:
-                f.write(f"  {package}\n")
-            
-            for dep in dependencies:
-                f.write(f"    └── {dep}\n")
-    
-    print(f" Текстовое представление сохранено в: {output_file}")
-    
-    # Сравнение со стандартными инструментами
-    print(f"\n Сравнение с штатными инструментами для '{config['package_name']}':")
-    print("   Стандартные инструменты Python:")
-    print("   - pipdeptree: показывает дерево зависимостей")
-    print("   - pip show: базовая информация о пакете")
-    print("\n   Преимущества нашего инструмента:")
-    print("   + Обнаружение циклических зависимостей")
-    print("   + Гибкая настройка через конфигурационный файл")
-    print("   + Поддержка тестового режима")
-    
-    # Демонстрация для нескольких пакетов
-    demo_packages = ['flask', 'numpy', 'pandas']
-    print(f"\n Примеры визуализации для пакетов: {', '.join(demo_packages)}")
+        lines = write_dependency_tree(
+            graph, config['package_name'], f,
+            max_depth=config.get('tree_max_depth'),
+            max_lines=config.get('tree_max_lines'),
+            start_line=4
+        )
+    
+    print(f" Текстовое представление сохранено в: {output_file} (строк дерева: {lines})")
+
+def save_metrics(metrics: Metrics, args):
+    """Сохранение собранных метрик и трассы выполнения"""
+    if not metrics.enabled:
+        return
+    metrics.write_json(args.metrics_out)
+    print(f"📊 Метрики сохранены в: {args.metrics_out}")
+    if args.trace_out:
+        metrics.write_chrome_trace(args.trace_out)
+        print(f"📊 Трасса выполнения сохранена в: {args.trace_out}")
 
 def main():
+    # Парсинг аргументов командной строки
+    parser = argparse.ArgumentParser(description='Визуализатор графа зависимостей Python')
+    parser.add_argument('--config', '-c', default='config.toml', 
+                      help='Путь к конфигурационному файлу')
+    parser.add_argument('--ingest', metavar='DUMP',
+                      help='Загрузить дамп метаданных (JSON Lines или каталог JSON) в хранилище metadata_store')
+    parser.add_argument('--query-path', nargs=2, metavar=('SOURCE', 'TARGET'),
+                      help='Найти кратчайший путь зависимостей от SOURCE к TARGET без полного обхода')
+    parser.add_argument('--serve', action='store_true',
+                      help='Режим сервера: граф держится в памяти, запросы принимаются по HTTP или unix-сокету')
+    parser.add_argument('--profile', action='store_true',
+                      help='Сбор метрик: время этапов, HTTP-запросы, кэш, скорость обхода')
+    parser.add_argument('--metrics-out', default='metrics.json',
+                      help='Файл JSON с метриками (при --profile)')
+    parser.add_argument('--trace-out',
+                      help='Файл трассы в формате Chrome Trace Event (при --profile)')
+    
+    args = parser.parse_args()
+    metrics = Metrics(enabled=args.profile, trace=bool(args.trace_out))
+    
     try:
-        # Парсинг аргументов командной строки
-        parser = argparse.ArgumentParser(description='Визуализатор графа зависимостей Python')
-        parser.add_argument('--config', '-c', default='config.toml', 
-                          help='Путь к конфигурационному файлу')
-        
-        args = parser.parse_args()
-        
         print(" Запуск инструмента визуализации графа зависимостей")
         print("=" * 50)
         
         # Этап 1: Загрузка конфигурации
-        config_manager = ConfigManager()
-        config_manager.load_config(args.config)
-        config = config_manager.config
+        with metrics.stage('load_config'):
+            config_manager = ConfigManager()
+            config_manager.load_config(args.config)
+            config = config_manager.config
         
         print_config(config)
         print("✅ Этап 1 завершен: Конфигурация загружена")
         
-        # Этап 2: Сбор данных (заглушка)
-        dependencies = mock_dependencies_stage(config)
-        print("✅ Этап 2 завершен: Данные собраны")
-        
-        # Этап 3: Построение графа (заглушка)
-        graph = mock_build_graph_stage(config, dependencies)
-        print("✅ Этап 3 завершен: Граф построен")
-        
-        # Этап 4: Дополнительные операции (заглушка)
-        load_order = mock_additional_operations_stage(graph, config)
+        if args.ingest:
+            with metrics.stage('ingest'):
+                ingest_metadata_stage(config, args.ingest)
+            print("\n🎉 Дамп метаданных загружен!")
+            return
+        
+        if args.query_path:
+            with metrics.stage('path_query'):
+                path_query_stage(config, *args.query_path, metrics=metrics)
+            print("\n🎉 Запрос пути выполнен!")
+            return
+        
+        if args.serve:
+            with metrics.stage('serve'):
+                serve_stage(config, metrics)
+            return
+        
+        # Пакетный режим: несколько корней анализируются за один общий обход
+        roots = collect_batch_roots(config)
+        if roots:
+            with metrics.stage('batch_analysis'):
+                batch_analysis_stage(config, roots, metrics)
+            print("\n🎉 Пакетный анализ завершен!")
+            return
+        
+        # Этапы 2-3: Сбор данных и построение графа (потоково: поиск циклов,
+        # обратный индекс и D2 скрипт обновляются по мере обхода)
+        with metrics.stage('collect_and_build'):
+            result = pipeline_stage(config, metrics)
+        graph = result.graph_builder.graph
+        # Компактное представление, построенное для поиска циклов, используют и следующие этапы
+        compact = result.graph_builder.to_compact()
+        print("✅ Этапы 2-3 завершены: Данные собраны, граф построен")
+        
+        # Этап 4: Дополнительные операции
+        with metrics.stage('additional_operations'):
+            additional_operations_stage(compact, config, result.reverse)
+            if config.get('analytics', False):
+                graph_analytics_stage(compact, config, metrics)
         print("✅ Этап 4 завершен: Дополнительные операции выполнены")
         
-        # Этап 5: Визуализация (упрощенная)
-        simple_visualization_stage(graph, config)
+        # Этап 5: Визуализация
+        with metrics.stage('visualization'):
+            visualization_stage(graph, config, result.d2_file, compact)
+            simple_visualization_stage(graph, config)
         print("✅ Этап 5 завершен: Визуализация выполнена")
         
         print("\n🎉 Все этапы успешно завершены!")
-        print(f"📁 Результаты сохранены в: dependencies_tree.txt")
+        print(f"📁 Результаты сохранены в: {config['output_file']}, dependencies_tree.txt")
         
     except Exception as e:
         print(f"❌ Ошибка: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        # Метрики сохраняются и при ошибке, чтобы было видно, где прервался запуск
+        save_metrics(metrics, args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+# Через сколько попаданий накопленные времена обращения записываются в базу
+ACCESS_FLUSH_SIZE = 256
+
+
+def normalize_name(package_name: str) -> str:
+    """Нормализация имени пакета по PEP 503"""
+    return re.sub(r"[-_.]+", "-", package_name).lower()
+
+
+class CacheEntry(NamedTuple):
+    data: Dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class MetadataCache:
+    """Персистентный кэш метаданных пакетов в SQLite"""
+
+    def __init__(self, cache_dir: str = ".dependency_cache", ttl: float = 24 * 3600,
+                 max_size_mb: float = 512):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "metadata.sqlite")
+        self.ttl = ttl
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL позволяет нескольким процессам (например, CI-задачам) читать кэш одновременно
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON metadata (accessed_at)")
+        self._conn.commit()
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM metadata"
+        ).fetchone()[0]
+        # Время последнего обращения при попадании копится в памяти и записывается
+        # пакетом: UPDATE с фиксацией транзакции на каждое чтение дороже самого чтения
+        self._pending_access: Dict[str, float] = {}
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Получение записи из кэша (свежесть проверяется через is_fresh)"""
+        key = normalize_name(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM metadata WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._pending_access[key] = time.time()
+            if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+        body, etag, last_modified, fetched_at = row
+        return CacheEntry(json.loads(zlib.decompress(body)), etag, last_modified, fetched_at)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Проверка, не истек ли TTL записи"""
+        return time.time() - entry.fetched_at < self.ttl
+
+    def put(self, key: str, data: Dict, etag: Optional[str] = None,
+            last_modified: Optional[str] = None):
+        """Сохранение записи в кэш с вытеснением по LRU при превышении размера"""
+        key = normalize_name(key)
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM metadata WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_size -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, len(body), etag, last_modified, now, now)
+            )
+            self._total_size += len(body)
+            # Вытеснение учитывает и еще не записанные обращения
+            self._flush_access()
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, key: str):
+        """Продление срока жизни записи после успешной ревалидации (ответ 304)"""
+        key = normalize_name(key)
+        now = time.time()
+        with self._lock:
+            self._pending_access.pop(key, None)
+            self._conn.execute(
+                "UPDATE metadata SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        """Удаление записи из кэша"""
+        key = normalize_name(key)
+        with self._lock:
+            self._pending_access.pop(key, None)
+            row = self._conn.execute("SELECT size FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._total_size -= row[0]
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                self._conn.commit()
+
+    def _flush_access(self):
+        """Запись накопленных времен обращения (фиксирует транзакцию вызывающий)"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE metadata SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _evict(self):
+        """Вытеснение давно не использованных записей"""
+        while self._total_size > self.max_size:
+            rows = self._conn.execute(
+                "SELECT key, size FROM metadata ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                self._total_size -= size
+                if self._total_size <= self.max_size:
+                    break
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from metadata_cache import normalize_name
+from requirements_parser import parse_requirement
+from version_utils import latest_version
+
+
+def _is_newer(candidate: str, current: str) -> int:
+    """SQL-функция: 1, если candidate новее current с учетом предпочтения стабильных версий"""
+    if current is None:
+        return 1
+    return int(candidate != current and latest_version([current, candidate]) == candidate)
+
+
+def _requirement_name(requirement: str) -> Optional[str]:
+    """SQL-функция: нормализованное имя пакета из строки requires_dist"""
+    parsed = parse_requirement(requirement)
+    return parsed.name if parsed else None
+
+
+def _normalize_record(record: Dict) -> Optional[Tuple[str, str, str, str]]:
+    """Запись дампа в строку таблицы: плоская (name, version, requires_dist) или JSON API PyPI"""
+    info = record.get('info', record)
+    name = info.get('name')
+    version = info.get('version')
+    if not name or not version:
+        return None
+    requires_dist = info.get('requires_dist') or []
+    return normalize_name(name), name, version, json.dumps(requires_dist, separators=(",", ":"))
+
+
+def iter_dump_records(path: str) -> Iterator[Dict]:
+    """Потоковое чтение дампа: JSON Lines (в том числе .gz) или каталог JSON-файлов пакетов"""
+    if os.path.isdir(path):
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                if file_name.endswith('.json'):
+                    with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8') as f:
+                        yield json.load(f)
+        return
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class MetadataStore:
+    """Локальное индексированное хранилище метаданных пакетов (SQLite).
+
+    Для каждого пакета хранится последняя версия из дампа и ее requires_dist;
+    сборщик зависимостей использует хранилище вместо сетевых запросов.
+    Таблица requirements - обратный индекс (зависимость -> зависящие пакеты)
+    для запросов, которые идут по графу от зависимости к зависимым.
+    """
+
+    def __init__(self, db_path: str):
+        self.path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.create_function("is_newer", 2, _is_newer, deterministic=True)
+        self._conn.create_function("requirement_name", 1, _requirement_name, deterministic=True)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS packages (
+                name TEXT PRIMARY KEY,
+                display_name TEXT NOT NULL,
+                version TEXT NOT NULL,
+                requires_dist TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS requirements (
+                dependency TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (dependency, name)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def ingest(self, records: Iterable[Dict], batch_size: int = 10000) -> int:
+        """Потоковая загрузка записей пачками; для каждого пакета остается последняя версия"""
+        count = 0
+        batch: List[Tuple[str, str, str, str]] = []
+        with self._lock:
+            # Дамп можно загрузить повторно, поэтому долговечность записи не нужна
+            self._conn.execute("PRAGMA synchronous=OFF")
+            try:
+                for record in records:
+                    row = _normalize_record(record)
+                    if row is None:
+                        continue
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        count += self._insert(batch)
+                        batch = []
+                if batch:
+                    count += self._insert(batch)
+                self._rebuild_requirements()
+            finally:
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+        return count
+
+    def ingest_path(self, path: str, batch_size: int = 10000) -> int:
+        """Загрузка дампа из файла JSON Lines или каталога JSON-файлов"""
+        return self.ingest(iter_dump_records(path), batch_size)
+
+    def _insert(self, rows: List[Tuple[str, str, str, str]]) -> int:
+        self._conn.executemany("""
+            INSERT INTO packages (name, display_name, version, requires_dist) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                display_name = excluded.display_name,
+                version = excluded.version,
+                requires_dist = excluded.requires_dist
+            WHERE is_newer(excluded.version, packages.version)
+        """, rows)
+        self._conn.commit()
+        return len(rows)
+
+    def _rebuild_requirements(self):
+        """Пересборка обратного индекса одним проходом после загрузки дампа"""
+        self._conn.execute("DELETE FROM requirements")
+        self._conn.execute("""
+            INSERT OR IGNORE INTO requirements (dependency, name)
+            SELECT requirement_name(value), packages.name
+            FROM packages, json_each(packages.requires_dist)
+            WHERE requirement_name(value) IS NOT NULL AND requirement_name(value) != packages.name
+        """)
+        self._conn.commit()
+
+    def get_dependents(self, package_name: str) -> List[str]:
+        """Пакеты, у которых package_name указан в requires_dist"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.display_name FROM requirements r JOIN packages p ON p.name = r.name "
+                "WHERE r.dependency = ?",
+                (normalize_name(package_name),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, package_name: str) -> Optional[Dict]:
+        """Версия и requires_dist пакета или None, если пакета нет в хранилище"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT display_name, version, requires_dist FROM packages WHERE name = ?",
+                (normalize_name(package_name),)
+            ).fetchone()
+        if row is None:
+            return None
+        display_name, version, requires_dist = row
+        return {'name': display_name, 'version': version, 'requires_dist': json.loads(requires_dist)}
+
+    def count(self) -> int:
+        """Число пакетов в хранилище"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def ingest_metadata_stage(config: Dict, dump_path: str) -> int:
+    """Загрузка дампа метаданных в хранилище, указанное параметром metadata_store"""
+    if not config.get('metadata_store'):
+        raise Exception("Для загрузки дампа задайте параметр 'metadata_store' в конфигурации")
+    print(f"\nЗагрузка дампа метаданных: {dump_path}")
+    store = MetadataStore(config['metadata_store'])
+    try:
+        count = store.ingest_path(dump_path)
+        print(f" Обработано записей: {count}, пакетов в хранилище: {store.count()}")
+    finally:
+        store.close()
+    return count
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class Histogram:
+    """Гистограмма с экспоненциальными корзинами (границы 1, 2, 4, ... единиц)"""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        bound = 1
+        while bound < value:
+            bound *= 2
+        self.buckets[bound] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'buckets': {f"<={bound}": n for bound, n in sorted(self.buckets.items())}
+        }
+
+
+class Metrics:
+    """Сбор метрик выполнения: время этапов, счетчики, гистограммы и трасса Chrome.
+
+    При enabled=False все методы сразу возвращаются, поэтому объект можно
+    передавать в компоненты безусловно. События трассы (по одному на каждый
+    HTTP-запрос) накапливаются только при trace=True, когда трасса будет записана.
+    """
+
+    def __init__(self, enabled: bool = True, trace: bool = False):
+        self.enabled = enabled
+        self.trace = enabled and trace
+        self.stages: List[Dict] = []
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+        self.trace_events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замер реального и процессорного времени этапа"""
+        if not self.enabled:
+            yield
+            return
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            with self._lock:
+                self.stages.append({
+                    'name': name,
+                    'wall_seconds': round(wall, 6),
+                    'cpu_seconds': round(cpu, 6)
+                })
+            self.span(name, wall_start, wall, 'stage')
+
+    def span(self, name: str, start: float, duration: float, category: str = 'event'):
+        """Событие трассы; start - значение time.perf_counter() в начале"""
+        if not self.trace:
+            return
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        with self._lock:
+            self.trace_events.append(event)
+
+    def increment(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def gauge(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def to_dict(self) -> Dict:
+        """Сводка метрик, включая производные показатели"""
+        counters = dict(self.counters)
+        derived = {}
+        # Ответ 304 тоже обслуживается из кэша, хотя и стоит одного запроса
+        cache_served = counters.get('cache.hit', 0) + counters.get('cache.not_modified', 0)
+        cache_lookups = (counters.get('cache.hit', 0) + counters.get('cache.miss', 0)
+                         + counters.get('cache.revalidate', 0))
+        if cache_lookups:
+            derived['cache_hit_ratio'] = round(cache_served / cache_lookups, 4)
+            derived['cache_fresh_hit_ratio'] = round(counters.get('cache.hit', 0) / cache_lookups, 4)
+        if counters.get('http.requests'):
+            derived['http_bytes_per_request'] = round(
+                counters.get('http.bytes', 0) / counters['http.requests'], 1
+            )
+        return {
+            'stages': self.stages,
+            'counters': counters,
+            'gauges': dict(self.gauges),
+            'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+            'derived': derived
+        }
+
+    def write_json(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def write_chrome_trace(self, file_path: str):
+        """Трасса в формате Chrome Trace Event (chrome://tracing, Perfetto)"""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from dependency_collector import create_collector
+from metadata_cache import normalize_name
+from metrics import Metrics
+
+
+class PathResult(NamedTuple):
+    # Кратчайший путь от источника к цели (None, если путь не найден)
+    path: Optional[List[str]]
+    # Число пакетов, зависимости которых были загружены
+    fetched: int
+    # True, если отсутствие пути доказано: одна из сторон поиска исчерпана полностью
+    exhaustive: bool
+    # Пояснение результата для вывода пользователю
+    reason: str
+
+
+class PathQuery:
+    """Ленивый поиск кратчайшего пути зависимостей без полного обхода графа.
+
+    Прямая сторона загружает зависимости через сборщик только для пакетов
+    очередного уровня поиска в ширину. Если задан reverse_lookup (обратный индекс
+    из локального хранилища), навстречу идет поиск от цели по зависимым пакетам,
+    и на каждом шаге расширяется меньший фронт. Узлы сравниваются по именам,
+    нормализованным по PEP 503. reverse_complete означает, что обратный индекс
+    построен по тем же данным, что читает сборщик, и исчерпание обратной стороны
+    доказывает отсутствие пути.
+    """
+
+    def __init__(self, collector, reverse_lookup: Callable[[str], List[str]] = None,
+                 reverse_complete: bool = False, max_depth: int = None, max_workers: int = 1):
+        self.collector = collector
+        self.reverse_lookup = reverse_lookup
+        self.reverse_complete = reverse_complete
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        # Загруженные прямые зависимости (по нормализованному имени)
+        self.dependencies: Dict[str, List[str]] = {}
+        # Имя пакета в том написании, в котором он встретился первым
+        self.names: Dict[str, str] = {}
+        self.failed: Set[str] = set()
+
+    def find_path(self, source: str, target: str) -> PathResult:
+        """Кратчайший путь source -> ... -> target или доказательство его отсутствия"""
+        # Ребра обратного индекса, не подтвержденные прямыми зависимостями
+        invalid: Set[Tuple[str, str]] = set()
+        while True:
+            path, exhaustive, reason = self._search(source, target, invalid)
+            if path is None:
+                return PathResult(None, len(self.dependencies), exhaustive, reason)
+            wrong_edge = self._verify(path)
+            if wrong_edge is None:
+                return PathResult([self.names[node] for node in path],
+                                  len(self.dependencies), True, reason)
+            # Обратный индекс может расходиться с репозиторием (другая версия пакета):
+            # ребро исключается, и поиск повторяется с уже загруженными данными
+            invalid.add(wrong_edge)
+
+    def _search(self, source: str, target: str,
+                invalid: Set[Tuple[str, str]]) -> Tuple[Optional[List[str]], bool, str]:
+        source_key, target_key = self._key(source), self._key(target)
+        if source_key == target_key:
+            return [source_key], True, "источник совпадает с целью"
+
+        # Родитель на пути от источника и следующий узел на пути к цели
+        forward = {source_key: None}
+        backward = {target_key: None}
+        forward_frontier = [source_key]
+        backward_frontier = [target_key] if self.reverse_lookup else []
+        forward_depth = backward_depth = 0
+
+        while forward_frontier:
+            if self.max_depth and forward_depth + backward_depth >= self.max_depth:
+                return None, False, f"путь длиннее {self.max_depth} не проверялся"
+
+            expand_backward = backward_frontier and len(backward_frontier) < len(forward_frontier)
+            meetings = []
+            if expand_backward:
+                next_frontier = []
+                for node in backward_frontier:
+                    for dependent in self.reverse_lookup(self.names[node]):
+                        key = self._key(dependent)
+                        if key in backward or (key, node) in invalid:
+                            continue
+                        backward[key] = node
+                        next_frontier.append(key)
+                        if key in forward:
+                            meetings.append(key)
+                backward_frontier = next_frontier
+                backward_depth += 1
+                if not backward_frontier and not meetings and self.reverse_complete:
+                    return None, True, (f"пакеты, зависящие от {target}, перебраны полностью "
+                                        f"({len(backward)}), {source} среди них нет")
+            else:
+                next_frontier = []
+                for node, dependencies in self._fetch_level(forward_frontier):
+                    for dep in dependencies:
+                        key = self._key(dep)
+                        if key in forward:
+                            continue
+                        forward[key] = node
+                        next_frontier.append(key)
+                        if key in backward:
+                            meetings.append(key)
+                forward_frontier = next_frontier
+                forward_depth += 1
+
+            if meetings:
+                # Встречи одного уровня могут давать пути разной длины, выбирается кратчайший
+                meeting = min(meetings, key=lambda key: (self._distance(forward, key)
+                                                         + self._distance(backward, key)))
+                return self._join(forward, backward, meeting), True, "путь найден"
+
+        if self.failed.intersection(forward):
+            return None, False, (f"не удалось загрузить зависимости части пакетов "
+                                 f"({len(self.failed)}), отсутствие пути не доказано")
+        return None, True, (f"все транзитивные зависимости {source} перебраны "
+                            f"({len(forward)}), {target} среди них нет")
+
+    def _fetch_level(self, frontier: List[str]) -> List[Tuple[str, List[str]]]:
+        """Загрузка зависимостей уровня поиска (параллельно при max_workers > 1)"""
+        missing = [node for node in frontier if node not in self.dependencies and node not in self.failed]
+        if self.max_workers > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(self._fetch, missing))
+        else:
+            results = [self._fetch(node) for node in missing]
+        for node, dependencies in zip(missing, results):
+            if dependencies is None:
+                self.failed.add(node)
+            else:
+                self.dependencies[node] = dependencies
+        return [(node, self.dependencies[node]) for node in frontier if node in self.dependencies]
+
+    def _fetch(self, node: str) -> Optional[List[str]]:
+        try:
+            return self.collector.get_direct_dependencies(self.names[node])
+        except Exception as e:
+            print(f" Предупреждение: не удалось получить зависимости для {self.names[node]}: {e}")
+            return None
+
+    def _verify(self, path: List[str]) -> Optional[Tuple[str, str]]:
+        """Проверка ребер пути по прямым зависимостям; возвращает первое неподтвержденное ребро"""
+        for node, next_node in zip(path, path[1:]):
+            if node not in self.dependencies:
+                self._fetch_level([node])
+            if next_node not in {self._key(dep) for dep in self.dependencies.get(node, [])}:
+                return node, next_node
+        return None
+
+    def _key(self, name: str) -> str:
+        key = normalize_name(name)
+        self.names.setdefault(key, name)
+        return key
+
+    @staticmethod
+    def _distance(parents: Dict[str, Optional[str]], node: str) -> int:
+        distance = 0
+        while parents[node] is not None:
+            node = parents[node]
+            distance += 1
+        return distance
+
+    @staticmethod
+    def _join(forward: Dict[str, Optional[str]], backward: Dict[str, Optional[str]],
+              meeting: str) -> List[str]:
+        path = [meeting]
+        while forward[path[-1]] is not None:
+            path.append(forward[path[-1]])
+        path.reverse()
+        while backward[path[-1]] is not None:
+            path.append(backward[path[-1]])
+        return path
+
+
+def path_query_stage(config: Dict, source: str, target: str, metrics: Metrics = None) -> PathResult:
+    """Запрос пути зависимостей между двумя пакетами без полного обхода"""
+    print(f"\nПоиск пути зависимостей: {source} -> {target}")
+    collector = create_collector(config, metrics)
+    # Обратная сторона поиска доступна, когда зависимости читаются из локального хранилища
+    store = collector.store
+    query = PathQuery(
+        collector,
+        reverse_lookup=store.get_dependents if store else None,
+        reverse_complete=store is not None,
+        max_depth=config.get('max_depth'),
+        max_workers=config.get('max_workers', 1)
+    )
+    result = query.find_path(source, target)
+    if metrics:
+        metrics.gauge('path_query.fetched', result.fetched)
+
+    if result.path:
+        print(f" Путь найден ({len(result.path) - 1} ребер): {' -> '.join(result.path)}")
+    elif result.exhaustive:
+        print(f" Пути нет: {result.reason}")
+    else:
+        print(f" Путь не найден: {result.reason}")
+    print(f" Загружено пакетов: {result.fetched}")
+    return result
@@ -0,0 +1,158 @@
+import time
+from collections.abc import Mapping
+from typing import Dict, List, NamedTuple, Optional, Set
+from dependency_collector import create_collector
+from dependency_graph import DependencyGraph, iter_graph_from_config, print_cycles
+from graph_algorithms import cyclic_components
+from metrics import Metrics
+from visualizer import D2_FILE, D2StreamWriter
+
+# Сколько найденных при обходе циклов выводить сразу (остальные попадут в итоговый отчет)
+MAX_REPORTED_CYCLES = 10
+# Интервал вывода прогресса обхода, с
+PROGRESS_INTERVAL = 5.0
+
+
+class ReverseIndex(Mapping):
+    """Обратный индекс, пополняемый по мере обхода: пакет -> пакеты, которые от него зависят.
+
+    Передается в этап 4 как reverse_graph, поэтому обратный граф не строится заново.
+    """
+
+    def __init__(self):
+        self.dependents: Dict[str, List[str]] = {}
+
+    def add(self, package: str, dependencies: List[str]):
+        for dep in dependencies:
+            self.dependents.setdefault(dep, []).append(package)
+
+    def get(self, package: str, default=None) -> List[str]:
+        return self.dependents.get(package, [] if default is None else default)
+
+    def __getitem__(self, package: str) -> List[str]:
+        return self.dependents[package]
+
+    def __iter__(self):
+        return iter(self.dependents)
+
+    def __len__(self) -> int:
+        return len(self.dependents)
+
+
+class OnlineCycleDetector:
+    """Обнаружение циклов по мере поступления ребер.
+
+    Компоненты сильной связности уже полученной части графа пересчитываются
+    каждый раз, когда число ребер вырастает в growth раз, поэтому общая работа
+    остается O(V + E), а цикл сообщается вскоре после того, как замкнулся.
+    Незагруженные пакеты не имеют исходящих ребер, поэтому найденные циклы -
+    настоящие. Полный отчет по компонентам дает detect_cycles после обхода.
+    """
+
+    def __init__(self, growth: float = 2.0, min_edges: int = 1000):
+        self.growth = growth
+        # Списки зависимостей не копируются: это те же списки, что и в графе обхода
+        self.successors: Dict[str, List[str]] = {}
+        self.cycles: List[List[str]] = []
+        self.edge_count = 0
+        self._next_check = min_edges
+        self._reported: Set[str] = set()
+
+    def add(self, package: str, dependencies: List[str]) -> List[List[str]]:
+        """Добавление пакета и его ребер; возвращает новые найденные циклы.
+
+        Повторно выданный пакет приходит с добавленными зависимостями, которые
+        обход уже дописал в общий с графом список, поэтому список не заменяется.
+        """
+        self.successors.setdefault(package, dependencies)
+        self.edge_count += len(dependencies)
+        # Самозависимость - цикл из одного пакета, проверка не нужна
+        if package in dependencies and package not in self._reported:
+            return self._report([package])
+        if self.edge_count < self._next_check:
+            return []
+        self._next_check = int(self.edge_count * self.growth)
+        return self.check()
+
+    def check(self) -> List[List[str]]:
+        """Пересчет компонент текущего графа; возвращает циклы новых компонент"""
+        found = []
+        for component, cycle in cyclic_components(self.successors):
+            # Компонента, выросшая из уже найденной, повторно не сообщается
+            if not self._reported.intersection(component):
+                self._reported.update(component)
+                found.extend(self._report(cycle))
+        return found
+
+    def _report(self, cycle: List[str]) -> List[List[str]]:
+        self._reported.update(cycle)
+        self.cycles.append(cycle)
+        return [cycle]
+
+
+class PipelineResult(NamedTuple):
+    graph_builder: DependencyGraph
+    reverse: ReverseIndex
+    # Записанный при обходе D2 скрипт (None, если перед визуализацией граф упрощается)
+    d2_file: Optional[str]
+
+
+def pipeline_stage(config: Dict, metrics: Metrics = None) -> PipelineResult:
+    """Этапы 2-3: потоковый сбор данных и построение графа.
+
+    Ребра поступают из обхода по мере загрузки пакетов, и их сразу обрабатывают
+    обратный индекс, поиск циклов и запись D2 скрипта. Память не ограничена
+    константой: граф и обратный индекс занимают O(V + E), словарь поиска циклов
+    при обходе освобождается до итогового поиска компонент.
+    """
+    metrics = metrics or Metrics(enabled=False)
+    root = config['package_name']
+    print(f"\nЭтапы 2-3: Сбор данных и построение графа для {root}")
+
+    collector = create_collector(config, metrics)
+    graph_builder = DependencyGraph(collector)
+    reverse = ReverseIndex()
+    detector = OnlineCycleDetector()
+
+    # Упрощение графа (d2_reduce) требует графа целиком, поэтому D2 пишется потоково только без него
+    d2_file = None if config.get('d2_reduce') else D2_FILE
+    d2_out = open(d2_file, 'w', encoding='utf-8') if d2_file else None
+    try:
+        d2_writer = D2StreamWriter(d2_out, root) if d2_out else None
+        nodes = edges = 0
+        last_progress = time.monotonic()
+        for package, dependencies in iter_graph_from_config(graph_builder, config, [root], metrics):
+            # Пакет выдается повторно с добавленными зависимостями, если позже запрошены его дополнения
+            nodes = len(graph_builder.graph)
+            edges += len(dependencies)
+            if package == root and package not in detector.successors:
+                print(f"Прямые зависимости пакета '{root}':")
+                for i, dep in enumerate(dependencies, 1):
+                    print(f"  {i}. {dep}")
+
+            reverse.add(package, dependencies)
+            for cycle in detector.add(package, dependencies):
+                if len(detector.cycles) <= MAX_REPORTED_CYCLES:
+                    print(f" Обнаружен цикл: {' -> '.join(cycle)} -> {cycle[0]}")
+            if d2_writer:
+                d2_writer.add(package, dependencies)
+
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                print(f" Обработано пакетов: {nodes}, связей: {edges}, циклов: {len(detector.cycles)}")
+    finally:
+        if d2_out:
+            d2_out.close()
+
+    metrics.gauge('pipeline.online_cycles', len(detector.cycles))
+    # Частичный граф поиска циклов больше не нужен: итоговый отчет строит detect_cycles
+    detector = None
+    print(f" Граф построен. Всего узлов: {len(graph_builder.graph)}")
+    if d2_file:
+        print(f" D2 скрипт сохранен в: {d2_file} (связей: {d2_writer.edge_count})")
+
+    # Итоговый отчет по компонентам сильной связности, включая циклы, не показанные при обходе
+    graph_builder.detect_cycles()
+    print_cycles(graph_builder)
+    return PipelineResult(graph_builder, reverse, d2_file)
@@ -0,0 +1,85 @@
+from array import array
+from typing import List, Optional, Tuple
+from compact_graph import CompactGraph
+
+
+def popcount(bits: int) -> int:
+    """Число единичных битов (int.bit_count доступен с Python 3.10)"""
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+def iter_bits(bits: int):
+    """Номера единичных битов в порядке возрастания"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+
+
+class ReachabilityIndex:
+    """Индекс транзитивных обратных зависимостей.
+
+    Граф сводится к DAG компонент сильной связности, и для каждой компоненты
+    один раз вычисляется битовое множество всех пакетов, которые от нее зависят
+    (биты - идентификаторы узлов). После этого множество и число транзитивно
+    зависимых пакетов получаются без обхода графа. Память - O(C * V / 8) байт.
+    """
+
+    def __init__(self, compact: CompactGraph):
+        self.compact = compact
+        self.components = compact.strongly_connected_components()
+        self.component_of = array('i', bytes(4 * compact.node_count))
+        for component_id, component in enumerate(self.components):
+            for node in component:
+                self.component_of[node] = component_id
+
+        self.dependents: List[int] = [0] * len(self.components)
+        self._build()
+
+    def _build(self):
+        """Распространение множеств от зависимых пакетов к зависимостям в топологическом порядке"""
+        component_of = self.component_of
+        dependents = self.dependents
+        # Тарьян выдает компоненты от зависимостей к зависимым, поэтому идем с конца
+        for component_id in range(len(self.components) - 1, -1, -1):
+            bits = 0
+            for node in self.components[component_id]:
+                bits |= 1 << node
+                for predecessor in self.compact.predecessors(node):
+                    predecessor_component = component_of[predecessor]
+                    if predecessor_component != component_id:
+                        bits |= dependents[predecessor_component]
+            dependents[component_id] = bits
+
+    def _component(self, package: str) -> Optional[int]:
+        node = self.compact.id_of(package)
+        return None if node is None else self.component_of[node]
+
+    def get_transitive_dependents(self, package: str) -> List[str]:
+        """Все пакеты, прямо или транзитивно зависящие от данного"""
+        component_id = self._component(package)
+        if component_id is None:
+            return []
+        node = self.compact.id_of(package)
+        names = self.compact.names
+        return [names[i] for i in iter_bits(self.dependents[component_id]) if i != node]
+
+    def count_transitive_dependents(self, package: str) -> int:
+        """Число пакетов, прямо или транзитивно зависящих от данного"""
+        component_id = self._component(package)
+        if component_id is None:
+            return 0
+        return popcount(self.dependents[component_id]) - 1
+
+    def rank_by_blast_radius(self, limit: int = None) -> List[Tuple[str, int]]:
+        """Ранжирование всех пакетов по числу транзитивно зависящих от них пакетов"""
+        names = self.compact.names
+        ranking = []
+        for component_id, component in enumerate(self.components):
+            count = popcount(self.dependents[component_id]) - 1
+            ranking.extend((names[node], count) for node in component)
+        ranking.sort(key=lambda item: item[1], reverse=True)
+        return ranking[:limit] if limit is not None else ranking
@@ -0,0 +1,93 @@
+import mmap
+from typing import Dict, List, Optional, Tuple
+
+
+def _parse_edge(line: str) -> Optional[Tuple[str, str]]:
+    """Разбор строки вида 'A -> B' тестового файла"""
+    if '->' not in line:
+        return None
+    parts = line.split('->')
+    return parts[0].strip(), parts[1].strip()
+
+
+class RepositoryFileIndex:
+    """Индекс тестового репозитория, построенный за один проход по файлу.
+
+    Режим "memory" хранит список смежности целиком. Режим "mmap" хранит только
+    смещения строк каждого пакета и читает их из отображенного в память файла,
+    поэтому подходит для файлов, не помещающихся в оперативную память.
+    """
+
+    def __init__(self, file_path: str, mode: str = "memory"):
+        if mode not in ("memory", "mmap"):
+            raise Exception(f"Неизвестный режим индекса тестового файла: {mode}")
+        self.file_path = file_path
+        self.mode = mode
+        self.adjacency: Dict[str, List[str]] = {}
+        self.ranges: Dict[str, List[Tuple[int, int]]] = {}
+        self._file = None
+        self._mmap = None
+
+        if mode == "memory":
+            self._load_adjacency()
+        else:
+            self._load_ranges()
+
+    def _load_adjacency(self):
+        """Потоковое чтение файла в список смежности"""
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                edge = _parse_edge(line)
+                if edge:
+                    self.adjacency.setdefault(edge[0], []).append(edge[1])
+
+    def _load_ranges(self):
+        """Построение индекса смещений: подряд идущие строки одного пакета сливаются в один диапазон"""
+        self._file = open(self.file_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            return
+
+        mm = self._mmap
+        size = len(mm)
+        pos = 0
+        last_source = None
+        while pos < size:
+            end = mm.find(b'\n', pos)
+            if end == -1:
+                end = size
+            arrow = mm.find(b'->', pos, end)
+            if arrow != -1:
+                source = mm[pos:arrow].strip().decode('utf-8')
+                ranges = self.ranges.setdefault(source, [])
+                if source == last_source and ranges and ranges[-1][1] == pos:
+                    ranges[-1] = (ranges[-1][0], end + 1)
+                else:
+                    ranges.append((pos, end + 1))
+                last_source = source
+            else:
+                last_source = None
+            pos = end + 1
+
+    def get_dependencies(self, package_name: str) -> List[str]:
+        """Получение прямых зависимостей пакета из индекса"""
+        if self.mode == "memory":
+            return list(self.adjacency.get(package_name, []))
+
+        dependencies = []
+        for start, end in self.ranges.get(package_name, []):
+            for line in self._mmap[start:end].decode('utf-8').split('\n'):
+                edge = _parse_edge(line)
+                if edge and edge[0] == package_name:
+                    dependencies.append(edge[1])
+        return dependencies
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,261 @@
+import functools
+import os
+import platform
+import re
+import sys
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+from metadata_cache import normalize_name
+from version_utils import version_key
+
+_NAME = re.compile(r"\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)\s*")
+_EXTRAS = re.compile(r"\[([^\]]*)\]\s*")
+_MARKER_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>===|==|!=|~=|<=|>=|<|>|not\s+in\b|in\b)
+      | (?P<bool>and\b|or\b)
+      | (?P<paren>[()])
+      | (?P<var>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+# Устаревшие имена переменных маркеров (PEP 345)
+_MARKER_ALIASES = {
+    'os.name': 'os_name',
+    'sys.platform': 'sys_platform',
+    'platform.version': 'platform_version',
+    'platform.machine': 'platform_machine',
+    'platform.python_implementation': 'platform_python_implementation',
+    'python_implementation': 'platform_python_implementation',
+}
+
+_VERSION_OPS = {'<', '<=', '>', '>=', '==', '!=', '~='}
+
+
+class Requirement(NamedTuple):
+    # Имя пакета, нормализованное по PEP 503
+    name: str
+    extras: FrozenSet[str]
+    # Разобранный маркер окружения (вложенные кортежи) или None
+    marker: Optional[Tuple]
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_requirement(line: str) -> Optional[Requirement]:
+    """Разбор строки требования PEP 508 (requires_dist); None для некорректных строк"""
+    match = _NAME.match(line)
+    if not match:
+        return None
+    name = normalize_name(match.group(1))
+    rest = line[match.end():]
+
+    extras = frozenset()
+    extras_match = _EXTRAS.match(rest)
+    if extras_match:
+        extras = frozenset(normalize_name(extra.strip())
+                           for extra in extras_match.group(1).split(',') if extra.strip())
+        rest = rest[extras_match.end():]
+
+    # В требованиях с URL маркер отделяется пробелом перед ';'
+    separator = ' ;' if rest.lstrip().startswith('@') else ';'
+    marker = None
+    if separator in rest:
+        marker_text = rest.split(separator, 1)[1]
+        try:
+            marker = parse_marker(marker_text)
+        except ValueError:
+            return None
+    return Requirement(name, extras, marker)
+
+
+@functools.lru_cache(maxsize=16384)
+def parse_marker(text: str) -> Tuple:
+    """Разбор маркера окружения в дерево ('or'|'and', a, b) и ('cmp', lhs, op, rhs)"""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _MARKER_TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Некорректный маркер: {text}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            tokens.append(('str', value[1:-1]))
+        elif kind == 'var':
+            tokens.append(('var', _MARKER_ALIASES.get(value, value)))
+        elif kind == 'op':
+            tokens.append(('op', ' '.join(value.split())))
+        else:
+            tokens.append((kind, value))
+        position = match.end()
+
+    parser = _MarkerParser(tokens)
+    tree = parser.parse_or()
+    if parser.position != len(tokens):
+        raise ValueError(f"Некорректный маркер: {text}")
+    return tree
+
+
+class _MarkerParser:
+    """Рекурсивный спуск по грамматике маркеров: or -> and -> (выражение | сравнение)"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, kind: str):
+        token = self._peek()
+        if token[0] != kind:
+            raise ValueError("Некорректный маркер")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self._peek() == ('bool', 'or'):
+            self.position += 1
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_atom()
+        while self._peek() == ('bool', 'and'):
+            self.position += 1
+            node = ('and', node, self.parse_atom())
+        return node
+
+    def parse_atom(self):
+        if self._peek() == ('paren', '('):
+            self.position += 1
+            node = self.parse_or()
+            self._take('paren')
+            return node
+        lhs = self._value()
+        op = self._take('op')[1]
+        rhs = self._value()
+        return ('cmp', lhs, op, rhs)
+
+    def _value(self):
+        token = self._peek()
+        if token[0] not in ('str', 'var'):
+            raise ValueError("Некорректный маркер")
+        self.position += 1
+        return token
+
+
+def default_environment() -> Dict[str, str]:
+    """Значения переменных маркеров для текущего интерпретатора (PEP 508)"""
+    implementation_version = '.'.join(str(part) for part in sys.implementation.version[:3])
+    return {
+        'implementation_name': sys.implementation.name,
+        'implementation_version': implementation_version,
+        'os_name': os.name,
+        'platform_machine': platform.machine(),
+        'platform_release': platform.release(),
+        'platform_system': platform.system(),
+        'platform_version': platform.version(),
+        'python_full_version': platform.python_version(),
+        'platform_python_implementation': platform.python_implementation(),
+        'python_version': '.'.join(platform.python_version_tuple()[:2]),
+        'sys_platform': sys.platform,
+    }
+
+
+def target_environment(overrides: Dict[str, str] = None) -> Dict[str, str]:
+    """Целевое окружение: текущий интерпретатор с заменой заданных переменных"""
+    environment = default_environment()
+    overrides = dict(overrides or {})
+    # Заданная python_version без python_full_version задает и полную версию
+    if 'python_version' in overrides and 'python_full_version' not in overrides:
+        overrides['python_full_version'] = overrides['python_version']
+    environment.update({key: str(value) for key, value in overrides.items()})
+    return environment
+
+
+def _release(version: str) -> Tuple[int, ...]:
+    parts = []
+    for part in version.split('.'):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+
+def _compare_versions(lhs: str, op: str, rhs: str) -> Optional[bool]:
+    """Сравнение версий по PEP 440; None, если значения не являются версиями"""
+    if op in ('==', '!=') and rhs.endswith('.*'):
+        prefix = _release(rhs[:-2])
+        matches = _release(lhs)[:len(prefix)] == prefix
+        return matches if op == '==' else not matches
+    left, right = version_key(lhs), version_key(rhs)
+    if left is None or right is None:
+        return None
+    if op == '~=':
+        prefix = _release(rhs)[:-1]
+        return left >= right and _release(lhs)[:len(prefix)] == prefix
+    return {
+        '<': left < right, '<=': left <= right, '>': left > right,
+        '>=': left >= right, '==': left == right, '!=': left != right,
+    }[op]
+
+
+def _evaluate(node: Tuple, environment: Dict[str, str], extras: FrozenSet[str]) -> bool:
+    kind = node[0]
+    if kind == 'or':
+        return _evaluate(node[1], environment, extras) or _evaluate(node[2], environment, extras)
+    if kind == 'and':
+        return _evaluate(node[1], environment, extras) and _evaluate(node[2], environment, extras)
+
+    _, lhs, op, rhs = node
+    # Маркер extra истинен, если запрошено хотя бы одно подходящее дополнение
+    if ('var', 'extra') in (lhs, rhs):
+        value = rhs if lhs == ('var', 'extra') else lhs
+        if value[0] != 'str':
+            return False
+        requested = normalize_name(value[1]) in extras
+        return requested if op == '==' else (not requested if op == '!=' else False)
+
+    left = environment.get(lhs[1], '') if lhs[0] == 'var' else lhs[1]
+    right = environment.get(rhs[1], '') if rhs[0] == 'var' else rhs[1]
+    if op == 'in':
+        return left in right
+    if op == 'not in':
+        return left not in right
+    if op == '===':
+        return left == right
+    if op in _VERSION_OPS:
+        result = _compare_versions(left, op, right)
+        if result is not None:
+            return result
+    # Значения, не являющиеся версиями, сравниваются как строки
+    if op == '==':
+        return left == right
+    if op == '!=':
+        return left != right
+    return False
+
+
+@functools.lru_cache(maxsize=16384)
+def marker_uses_extra(marker: Optional[Tuple]) -> bool:
+    """Зависит ли маркер от запрошенных дополнений (переменная extra)"""
+    if marker is None:
+        return False
+    if marker[0] in ('or', 'and'):
+        return marker_uses_extra(marker[1]) or marker_uses_extra(marker[2])
+    return ('var', 'extra') in (marker[1], marker[3])
+
+
+@functools.lru_cache(maxsize=65536)
+def _evaluate_cached(marker: Tuple, environment: Tuple, extras: FrozenSet[str]) -> bool:
+    return _evaluate(marker, dict(environment), extras)
+
+
+def evaluate_marker(marker: Optional[Tuple], environment: Dict[str, str],
+                    extras: FrozenSet[str] = frozenset()) -> bool:
+    """Выполняется ли маркер в заданном окружении при запрошенных дополнениях"""
+    if marker is None:
+        return True
+    return _evaluate_cached(marker, tuple(sorted(environment.items())), frozenset(extras))
@@ -0,0 +1,296 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from batch_analysis import collect_batch_roots
+from dependency_collector import create_collector
+from dependency_graph import DependencyGraph
+from graph_operations import GraphOperations
+from metadata_cache import normalize_name
+from metrics import Metrics
+
+
+class AnalysisState:
+    """Неизменяемое состояние одного поколения: граф, циклы и индексы операций.
+
+    Обновление строит новое состояние целиком и подменяет ссылку на него,
+    поэтому запросы, начатые до подмены, дочитывают прежнее поколение.
+    """
+
+    def __init__(self, graph_builder: DependencyGraph, generation: int, serial: Optional[int] = None,
+                 reachability_index: bool = False):
+        self.graph_builder = graph_builder
+        self.generation = generation
+        self.serial = serial
+        self.built_at = time.time()
+        self.operations = GraphOperations(graph_builder.to_compact(), reachability_index=reachability_index)
+        self.edge_count = self.operations.compact.edge_count
+
+    @property
+    def graph(self):
+        return self.graph_builder.graph
+
+    def resolve(self, package: str) -> Optional[str]:
+        """Имя пакета в графе: как задано или нормализованное по PEP 503"""
+        for name in (package, normalize_name(package)):
+            if self.operations.compact.id_of(name) is not None:
+                return name
+        return None
+
+
+class AnalysisServer:
+    """Долгоживущий сервис анализа с прогретым графом в памяти.
+
+    Сборщик (сессия HTTP и кэш метаданных), граф и индексы GraphOperations
+    создаются один раз. Ответы кэшируются по ключу (поколение, запрос), поэтому
+    после обновления графа старые ответы не выдаются. Обновление выполняется
+    в фоне по таймеру или по запросу POST /refresh.
+    """
+
+    def __init__(self, config: Dict, metrics: Metrics = None):
+        self.config = config
+        self.metrics = metrics or Metrics(enabled=False)
+        self.collector = create_collector(config, self.metrics)
+        self.roots = collect_batch_roots(config) or [config['package_name']]
+        self.cache_size = config.get('server_cache_size', 10000)
+        self.state: Optional[AnalysisState] = None
+        self._generation = 0
+        self._cache: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_requested = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Начальное состояние: из снимка (без обхода), иначе полный обход"""
+        snapshot_file = self.config.get('snapshot_file')
+        if snapshot_file and os.path.exists(snapshot_file):
+            graph_builder = DependencyGraph(self.collector)
+            snapshot = graph_builder.load_snapshot(snapshot_file)
+            if graph_builder.roots == graph_builder.root_keys(self.roots):
+                print(f" Граф загружен из снимка: {snapshot_file}")
+                self._install(graph_builder, snapshot.get('serial'))
+                # Снимок мог устареть: сразу запускается фоновое обновление
+                self._refresh_requested.set()
+                return
+            print(" Набор корневых пакетов изменился, выполняется полный обход")
+        self.refresh()
+
+    def refresh(self) -> AnalysisState:
+        """Построение нового поколения и атомарная подмена текущего состояния"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            max_depth = self.config.get('max_depth')
+            max_workers = self.config.get('max_workers', 1)
+            # Серийный номер фиксируется до обхода, как и при сохранении снимка
+            serial = self.collector.get_last_serial()
+            graph_builder = DependencyGraph(self.collector)
+            previous = self.state
+            if previous is None:
+                graph_builder.build_graph_multi(self.roots, max_depth, max_workers)
+            else:
+                changed = graph_builder.refresh_graph({
+                    'graph': previous.graph,
+                    'roots': previous.graph_builder.roots,
+                    'versions': previous.graph_builder.package_versions(),
+                    'failed': previous.graph_builder.failed,
+                    'serial': previous.serial
+                }, max_depth, max_workers)
+                print(f" Граф обновлен. Изменившихся пакетов: {len(changed)}")
+            graph_builder.detect_cycles()
+
+            if self.config.get('snapshot_file'):
+                graph_builder.save_snapshot(
+                    self.config['snapshot_file'],
+                    binary=self.config.get('snapshot_format', 'json') == 'binary',
+                    serial=serial
+                )
+            state = self._install(graph_builder, serial)
+            self.metrics.gauge('server.refresh_seconds', round(time.perf_counter() - start, 6))
+            return state
+
+    def _install(self, graph_builder: DependencyGraph, serial: Optional[int]) -> AnalysisState:
+        self._generation += 1
+        state = AnalysisState(graph_builder, self._generation, serial,
+                              self.config.get('reachability_index', False))
+        self.state = state
+        with self._cache_lock:
+            self._cache.clear()
+        self.metrics.gauge('server.generation', state.generation)
+        print(f" Поколение {state.generation}: узлов {len(state.graph)}, связей {state.edge_count}")
+        return state
+
+    def request_refresh(self):
+        self._refresh_requested.set()
+
+    def refresh_loop(self):
+        """Фоновое обновление по таймеру server_refresh_interval или по запросу"""
+        interval = self.config.get('server_refresh_interval', 3600)
+        while not self._stopped.is_set():
+            self._refresh_requested.wait(interval if interval else None)
+            if self._stopped.is_set():
+                return
+            self._refresh_requested.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f" Предупреждение: не удалось обновить граф: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self._refresh_requested.set()
+
+    def handle(self, endpoint: str, params: Dict[str, str]) -> Tuple[int, bytes]:
+        """Ответ на запрос (код, тело JSON) с кэшированием по поколению графа"""
+        state = self.state
+        key = (state.generation, endpoint, tuple(sorted(params.items())))
+        with self._cache_lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+        if body is not None:
+            self.metrics.increment('server.cache_hit')
+            return 200, body
+
+        self.metrics.increment('server.cache_miss')
+        status, payload = self._answer(state, endpoint, params)
+        payload['generation'] = state.generation
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        if status == 200:
+            with self._cache_lock:
+                self._cache[key] = body
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return status, body
+
+    def _answer(self, state: AnalysisState, endpoint: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+        if endpoint == 'status':
+            return 200, {
+                'roots': state.graph_builder.roots,
+                'nodes': len(state.graph),
+                'edges': state.edge_count,
+                'cycles': len(state.graph_builder.cycles),
+                'built_at': state.built_at,
+                'refreshing': self._refresh_lock.locked()
+            }
+        if endpoint == 'cycles':
+            graph_builder = state.graph_builder
+            return 200, {'cycles': [
+                {'cycle': cycle, 'component_size': len(component)}
+                for cycle, component in zip(graph_builder.cycles, graph_builder.components)
+            ]}
+        if endpoint not in ('dependencies', 'reverse', 'load-order'):
+            return 404, {'error': f"Неизвестный запрос: {endpoint}"}
+
+        if not params.get('package'):
+            return 400, {'error': "Не задан параметр 'package'"}
+        package = state.resolve(params['package'])
+        if package is None:
+            return 404, {'error': f"Пакет {params['package']} отсутствует в графе"}
+        transitive = params.get('transitive', '') in ('1', 'true')
+        operations = state.operations
+
+        if endpoint == 'dependencies':
+            if transitive:
+                result = [dep for dep in operations.get_load_order(package) if dep != package]
+            else:
+                result = list(operations.graph.get(package, []))
+            return 200, {'package': package, 'dependencies': result}
+        if endpoint == 'reverse':
+            if transitive:
+                result = operations.get_transitive_reverse_dependencies(package)
+            else:
+                result = list(operations.get_reverse_dependencies(package))
+            return 200, {'package': package, 'dependents': result}
+        return 200, {'package': package, 'load_order': operations.get_load_order(package)}
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API: GET /dependencies, /reverse, /load-order, /cycles, /status; POST /refresh"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        server: AnalysisServer = self.server.analysis
+        try:
+            status, body = server.handle(url.path.strip('/'), params)
+        except Exception as e:
+            status, body = 500, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+        self._send(status, body)
+        server.metrics.increment('server.requests')
+        server.metrics.observe('server.latency_ms', (time.perf_counter() - start) * 1000)
+
+    def do_POST(self):
+        server: AnalysisServer = self.server.analysis
+        if urlsplit(self.path).path.strip('/') != 'refresh':
+            self._send(404, json.dumps({'error': f"Неизвестный запрос: {self.path}"},
+                                       ensure_ascii=False).encode('utf-8'))
+            return
+        server.request_refresh()
+        self._send(202, json.dumps({'refresh': 'scheduled'}).encode('utf-8'))
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # У unix-сокета нет адреса клиента
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format: str, *args):
+        # Журнал каждого запроса отключен: на тысячах запросов он дороже самого ответа
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_stage(config: Dict, metrics: Metrics = None):
+    """Режим сервера: граф строится один раз, запросы обслуживаются до остановки"""
+    print("\nЗапуск сервера анализа зависимостей")
+    analysis = AnalysisServer(config, metrics)
+
+    # Сокет открывается до построения графа: занятый адрес обнаруживается сразу
+    socket_path = config.get('server_socket')
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = ThreadingUnixHTTPServer(socket_path, AnalysisRequestHandler)
+        address = f"unix:{socket_path}"
+    else:
+        host = config.get('server_host', '127.0.0.1')
+        port = config.get('server_port', 8765)
+        httpd = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+        httpd.daemon_threads = True
+        address = f"http://{host}:{httpd.server_address[1]}"
+    httpd.analysis = analysis
+    try:
+        analysis.start()
+    except BaseException:
+        httpd.server_close()
+        raise
+
+    refresher = threading.Thread(target=analysis.refresh_loop, name='graph-refresh', daemon=True)
+    refresher.start()
+    print(f" Сервер слушает {address} (остановка - Ctrl+C)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n Остановка сервера")
+    finally:
+        analysis.stop()
+        httpd.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,56 @@
+from typing import List, Mapping, Set, TextIO
+
+LEGEND = "↻ - цикл, (см. строку N) - поддерево уже показано, … - ограничение глубины"
+
+
+def write_dependency_tree(graph: Mapping[str, List[str]], root: str, out: TextIO,
+                          max_depth: int = None, max_lines: int = None, start_line: int = 1) -> int:
+    """Потоковая запись дерева зависимостей от корня; возвращает число строк дерева.
+
+    Поддерево каждого пакета раскрывается только при первой встрече, далее
+    выводится ссылка на строку, где оно показано, поэтому размер вывода и время
+    линейны по числу ребер даже для графов с множеством общих поддеревьев.
+    Зависимость, уже стоящая на текущем пути от корня, отмечается как цикл.
+    Строки пишутся сразу в out; в памяти - только стек пути и номера строк раскрытых пакетов.
+    start_line - номер строки корня в out (если перед деревом записан заголовок).
+    """
+    lines = 0
+    # Номер строки, в которой раскрыто поддерево пакета
+    first_line = {root: start_line}
+    on_path: Set[str] = {root}
+    out.write(f"★ {root}\n")
+    lines += 1
+
+    # Кадр стека: [пакет, его зависимости, индекс следующей зависимости, отступ]
+    stack = [[root, graph.get(root) or [], 0, ""]]
+    while stack:
+        frame = stack[-1]
+        package, dependencies, index, prefix = frame
+        if index == len(dependencies):
+            stack.pop()
+            on_path.discard(package)
+            continue
+        frame[2] += 1
+
+        if max_lines and lines >= max_lines:
+            out.write(f"… вывод ограничен {max_lines} строками\n")
+            break
+
+        dep = dependencies[index]
+        last = index == len(dependencies) - 1
+        branch = prefix + ("└── " if last else "├── ")
+        children = graph.get(dep) or []
+        if dep in on_path:
+            out.write(f"{branch}{dep} ↻\n")
+        elif children and dep in first_line:
+            out.write(f"{branch}{dep} (см. строку {first_line[dep]})\n")
+        elif children and max_depth is not None and len(stack) >= max_depth:
+            out.write(f"{branch}{dep} …\n")
+        else:
+            out.write(f"{branch}{dep}\n")
+            if children:
+                first_line[dep] = start_line + lines
+                on_path.add(dep)
+                stack.append([dep, children, 0, prefix + ("    " if last else "│   ")])
+        lines += 1
+    return lines
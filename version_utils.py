@@ -0,0 +1,60 @@
+import re
+from typing import Iterable, Optional, Tuple
+
+_VERSION_RE = re.compile(
+    r"^\s*v?(?:(?P<epoch>\d+)!)?(?P<release>\d+(?:\.\d+)*)"
+    r"(?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>\d*))?"
+    r"(?:-(?P<post_n1>\d+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>\d*))?"
+    r"(?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>\d*))?"
+    r"(?:\+[a-z0-9]+(?:[-_.][a-z0-9]+)*)?\s*$",
+    re.IGNORECASE
+)
+
+_PRE_RANK = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+
+
+def version_key(version: str) -> Optional[Tuple]:
+    """Ключ сортировки версии по PEP 440 (None для некорректных версий)"""
+    match = _VERSION_RE.match(version)
+    if not match:
+        return None
+
+    release = [int(part) for part in match.group('release').split('.')]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    post = match.group('post_n1') or match.group('post_n2')
+    has_post = match.group('post_n1') is not None or match.group('post_l') is not None
+    has_dev = match.group('dev_l') is not None
+
+    # dev-версия без pre/post идет раньше всех pre-релизов той же версии
+    if match.group('pre_l'):
+        pre = (0, _PRE_RANK[match.group('pre_l').lower()], int(match.group('pre_n') or 0))
+    elif has_dev and not has_post:
+        pre = (-1,)
+    else:
+        pre = (1,)
+
+    return (
+        int(match.group('epoch') or 0),
+        tuple(release),
+        pre,
+        (int(post or 0),) if has_post else (-1,),
+        (0, int(match.group('dev_n') or 0)) if has_dev else (1,)
+    )
+
+
+def is_prerelease(version: str) -> bool:
+    """Проверка, является ли версия pre- или dev-релизом"""
+    match = _VERSION_RE.match(version)
+    return bool(match and (match.group('pre_l') or match.group('dev_l')))
+
+
+def latest_version(versions: Iterable[str]) -> Optional[str]:
+    """Выбор последней версии (pre-релизы учитываются, только если нет стабильных)"""
+    valid = [v for v in versions if version_key(v) is not None]
+    stable = [v for v in valid if not is_prerelease(v)]
+    candidates = stable or valid
+    if not candidates:
+        return None
+    return max(candidates, key=version_key)
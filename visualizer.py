@@ -1,7 +1,108 @@
 import subprocess
 import os
+import re
+import shutil
+import hashlib
+import functools
 import tempfile
-from typing import Dict, List  # Добавлен импорт List
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from typing import Dict, List, Optional, TextIO, Tuple  # Добавлен импорт List
+from compact_graph import CompactGraph
+from graph_reduction import reduce_graph
+
+_D2_PLAIN_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# D2 скрипт основного графа
+D2_FILE = "dependencies_graph.d2"
+
+def d2_id(name: str) -> str:
+    """Идентификатор узла D2 (имена с точками и пробелами берутся в кавычки)"""
+    if _D2_PLAIN_ID.match(name):
+        return name
+    escaped = name.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+@functools.lru_cache(maxsize=None)
+def detect_d2() -> Optional[str]:
+    """Версия установленного D2 (None, если не установлен); проверка выполняется один раз за процесс"""
+    try:
+        result = subprocess.run(['d2', '--version'], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+def render_cache_key(d2_file: str, output_file: str) -> str:
+    """Ключ кэша рендеринга: хэш D2 скрипта, формата вывода и версии D2"""
+    digest = hashlib.sha256()
+    with open(d2_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(b'\0' + os.path.splitext(output_file)[1].lower().encode())
+    digest.update(b'\0' + (detect_d2() or '').encode())
+    return digest.hexdigest()
+
+def run_d2(d2_file: str, output_file: str, cache_dir: str = None) -> Optional[str]:
+    """Рендеринг одного D2 файла; формат определяется расширением выходного файла.
+    Возвращает 'cached' или 'rendered' при успехе и None при ошибке."""
+    cached_file = None
+    if cache_dir:
+        cached_file = os.path.join(
+            cache_dir, render_cache_key(d2_file, output_file) + os.path.splitext(output_file)[1]
+        )
+        if os.path.exists(cached_file):
+            shutil.copyfile(cached_file, output_file)
+            return 'cached'
+    
+    if detect_d2() is None:
+        return None
+    try:
+        subprocess.run(['d2', d2_file, output_file], capture_output=True, text=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    
+    if cached_file:
+        # Запись через временный файл, чтобы параллельные процессы не увидели неполный результат
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir)
+        os.close(fd)
+        shutil.copyfile(output_file, tmp_file)
+        os.replace(tmp_file, cached_file)
+    return 'rendered'
+
+class D2StreamWriter:
+    """Потоковая запись D2 скрипта: узлы и связи дописываются по мере поступления пакетов"""
+    
+    def __init__(self, out: TextIO, package_name: str):
+        self.out = out
+        self.added_nodes = {package_name}
+        self.edge_count = 0
+        out.write(f"""direction: right
+
+{d2_id(package_name)} {{
+    style: {{
+        fill: "#ff6b6b"
+        bold: true
+    }}
+}}
+""")
+    
+    def add(self, package: str, dependencies: List[str]):
+        """Запись пакета и его прямых зависимостей"""
+        out = self.out
+        package_id = d2_id(package)
+        if package not in self.added_nodes:
+            out.write(f'{package_id} {{\n    style: {{\n        fill: "#4ecdc4"\n    }}\n}}\n')
+            self.added_nodes.add(package)
+        
+        for dep in dependencies:
+            dep_id = d2_id(dep)
+            if dep not in self.added_nodes:
+                out.write(f'{dep_id} {{\n    style: {{\n        fill: "#45b7d1"\n    }}\n}}\n')
+                self.added_nodes.add(dep)
+            
+            out.write(f'{package_id} -> {dep_id}\n')
+            self.edge_count += 1
 
 class GraphVisualizer:
     def __init__(self):
@@ -9,10 +110,9 @@ class GraphVisualizer:
     
     def check_d2_installation(self):
         """Проверка установки D2"""
-        try:
-            subprocess.run(['d2', '--version'], capture_output=True, check=True)
+        if detect_d2():
             print("✅ D2 найден")
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        else:
             print("❌ D2 не установлен. Для установки выполните:")
             print("   curl -fsSL https://d2lang.com/install.sh | sh")
             print("   Или скачайте с: https://d2lang.com/")
@@ -21,74 +121,108 @@ class GraphVisualizer:
     
     def generate_d2_script(self, graph: Dict[str, List[str]], package_name: str) -> str:
         """Генерация D2 скрипта для визуализации графа"""
-        d2_script = f"""direction: right
-
-{package_name} {{
-    style: {{
-        fill: "#ff6b6b"
-        bold: true
-    }}
-}}
-"""
+        buffer = StringIO()
+        self.write_d2_script(graph, package_name, buffer)
+        return buffer.getvalue()
+    
+    def write_d2_script(self, graph: Dict[str, List[str]], package_name: str, out: TextIO) -> int:
+        """Потоковая запись D2 скрипта в файл; возвращает число связей"""
+        writer = D2StreamWriter(out, package_name)
         
         # Добавляем все узлы и связи
-        added_nodes = set([package_name])
-        
         for package, dependencies in graph.items():
-            if package not in added_nodes:
-                d2_script += f'{package} {{\n    style: {{\n        fill: "#4ecdc4"\n    }}\n}}\n'
-                added_nodes.add(package)
-            
-            for dep in dependencies:
-                if dep not in added_nodes:
-                    d2_script += f'{dep} {{\n    style: {{\n        fill: "#45b7d1"\n    }}\n}}\n'
-                    added_nodes.add(dep)
-                
-                d2_script += f'{package} -> {dep}\n'
+            writer.add(package, dependencies)
         
-        return d2_script
+        return writer.edge_count
     
-    def visualize_graph(self, graph: Dict[str, List[str]], config: Dict):
-        """Визуализация графа и сохранение в PNG"""
-        print("\ncleВизуализация графа")
-        
-        # Генерация D2 скрипта
-        d2_script = self.generate_d2_script(graph, config['package_name'])
+    def visualize_graph(self, graph: Dict[str, List[str]], config: Dict, d2_file: str = None,
+                        compact: CompactGraph = None):
+        """Визуализация графа и сохранение в PNG; d2_file - уже записанный при обходе D2 скрипт"""
+        print("\nВизуализация графа")
         
-        print("Сгенерированный D2 скрипт:")
-        print("=" * 40)
-        print(d2_script)
-        print("=" * 40)
-        
-        # Сохраняем D2 скрипт в файл
-        d2_file = "dependencies_graph.d2"
-        with open(d2_file, 'w', encoding='utf-8') as f:
-            f.write(d2_script)
+        root = config['package_name']
+        if d2_file is None:
+            # Упрощение графа перед раскладкой (сворачивание циклов, отсечение по глубине и т.д.)
+            graph, root = reduce_graph(graph, root, config.get('d2_reduce', {}), compact)
+            
+            # D2 скрипт записывается в файл по мере генерации, без сборки строки в памяти
+            d2_file = D2_FILE
+            with open(d2_file, 'w', encoding='utf-8') as f:
+                edge_count = self.write_d2_script(graph, root, f)
+            
+            print(f" D2 скрипт сохранен в: {d2_file} (узлов с зависимостями: {len(graph)}, связей: {edge_count})")
         
-        print(f" D2 скрипт сохранен в: {d2_file}")
+        # Задания рендеринга: основной граф во всех форматах и, при необходимости, шарды
+        formats = config.get('render_formats')
+        jobs = [(d2_file, output) for output in self._output_files(config['output_file'], formats)]
+        if config.get('render_shards', False):
+            jobs.extend(self.write_shards(graph, root, config['output_file'], formats))
         
-        # Пытаемся сгенерировать PNG, если D2 установлен
-        try:
-            output_file = config['output_file']
-            result = subprocess.run(
-                ['d2', d2_file, output_file], 
-                capture_output=True, 
-                text=True, 
-                check=True
-            )
-            print(f" Граф сохранен в файл: {output_file}")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("  Не удалось сгенерировать PNG (D2 не установлен)")
-            print(" Установите D2: curl -fsSL https://d2lang.com/install.sh | sh")
+        # Пытаемся сгенерировать изображения, если D2 установлен
+        self.render_all(jobs, config.get('render_workers'), config.get('render_cache_dir'))
         
         # Демонстрация для нескольких пакетов
         self.demo_multiple_packages()
     
+    def _output_files(self, output_file: str, formats: List[str] = None) -> List[str]:
+        """Имена выходных файлов для каждого запрошенного формата (png, svg, pdf)"""
+        if not formats:
+            return [output_file]
+        stem = os.path.splitext(output_file)[0]
+        return [f"{stem}.{fmt}" for fmt in formats]
+    
+    def write_shards(self, graph: Dict[str, List[str]], root: str, output_file: str,
+                     formats: List[str] = None) -> List[Tuple[str, str]]:
+        """Запись отдельного D2 файла для поддерева каждой прямой зависимости корня"""
+        shard_dir = f"{os.path.splitext(output_file)[0]}_shards"
+        os.makedirs(shard_dir, exist_ok=True)
+        
+        jobs = []
+        for dep in graph.get(root, []):
+            subgraph = {}
+            stack = [dep]
+            while stack:
+                package = stack.pop()
+                if package in subgraph or package not in graph:
+                    continue
+                subgraph[package] = graph[package]
+                stack.extend(graph[package])
+            # Листовые зависимости уже видны на основном графе
+            if not subgraph.get(dep):
+                continue
+            
+            shard_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', dep)
+            shard_file = os.path.join(shard_dir, f"{shard_name}.d2")
+            with open(shard_file, 'w', encoding='utf-8') as f:
+                self.write_d2_script(subgraph, dep, f)
+            shard_output = os.path.join(shard_dir, shard_name + os.path.splitext(output_file)[1])
+            jobs.extend((shard_file, output) for output in self._output_files(shard_output, formats))
+        
+        print(f" Шардов для рендеринга: {len(jobs)} файлов в каталоге {shard_dir}")
+        return jobs
+    
+    def render_all(self, jobs: List[Tuple[str, str]], workers: int = None, cache_dir: str = None):
+        """Параллельный рендеринг: каждый вызов D2 - отдельный процесс, потоки только ждут их завершения"""
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            results = list(executor.map(lambda job: run_d2(*job, cache_dir), jobs))
+        
+        failed = 0
+        for (_, output_file), status in zip(jobs, results):
+            if status == 'cached':
+                print(f" Граф сохранен в файл: {output_file} (из кэша рендеринга)")
+            elif status:
+                print(f" Граф сохранен в файл: {output_file}")
+            else:
+                failed += 1
+        if failed:
+            print(f"  Не удалось сгенерировать изображения: {failed} (D2 не установлен)")
+            print(" Установите D2: curl -fsSL https://d2lang.com/install.sh | sh")
+    
     def demo_multiple_packages(self):
         """Демонстрация визуализации для трех различных пакетов"""
         demo_packages = ['flask', 'numpy', 'pandas']
         print(f"\n Примеры визуализации для пакетов: {', '.join(demo_packages)}")
-        print("   Запустите инструмент с этими пакетами для сравнения!")
+        print(f"   Для анализа за один запуск укажите в конфигурации: packages = {demo_packages}")
     
     def compare_with_standard_tools(self, package_name: str):
         """Сравнение со штатными инструментами визуализации"""
@@ -103,12 +237,13 @@ class GraphVisualizer:
         print("   + Гибкая настройка через конфигурационный файл")
         print("   + Поддержка тестового режима")
 
-def visualization_stage(graph: Dict[str, List[str]], config: Dict):
+def visualization_stage(graph: Dict[str, List[str]], config: Dict, d2_file: str = None,
+                        compact: CompactGraph = None):
     """Этап 5: Визуализация графа"""
     visualizer = GraphVisualizer()
     
     # Визуализация основного графа
-    visualizer.visualize_graph(graph, config)
+    visualizer.visualize_graph(graph, config, d2_file, compact)
     
     # Сравнение со стандартными инструментами
     visualizer.compare_with_standard_tools(config['package_name'])
\ No newline at end of file